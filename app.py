@@ -1,5 +1,4 @@
 import streamlit as st
-import pytesseract
 
 st.set_page_config(
     page_title="Vehicle Registration and Monitoring App",
@@ -0,0 +1,200 @@
+import csv
+import hashlib
+import io
+import math
+import os
+import threading
+import time
+
+from plates import normalize_plate
+
+authorized_vehicles_csv = 'datasets/authorized_vehicles.csv'
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. A negative answer is certain; a positive
+    answer is wrong with probability about error_rate once capacity items are added.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class AuthorizationIndex:
+    """
+    Process-wide set of normalized authorized plates loaded from the registry CSV.
+
+    The file is checked at most every check_interval seconds. If it only grew, the
+    appended rows are read from the last offset and added to the set; any other
+    change triggers a full reload. Registries with at least bloom_threshold plates
+    also get a Bloom filter in front of the set, which rejects most unknown plates
+    without hashing into the large set.
+    """
+
+    def __init__(self, path=authorized_vehicles_csv, column='Plate_Number', check_interval=1.0,
+                 bloom_threshold=1_000_000):
+        self.path = path
+        self.column = column
+        self.check_interval = check_interval
+        self.bloom_threshold = bloom_threshold
+
+        self._plates = set()
+        self._bloom = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._column_index = None
+        self._offset = 0
+        self._mtime = None
+        self._tail = b''
+        self._next_check = 0.0
+
+        # Plates added by incremental reloads since the last full reload, in file order
+        self.appended = []
+
+        self.lookups = 0
+        self.reloads = 0
+        self.incremental_reloads = 0
+        self._lookup_time = 0.0
+        self._max_lookup_time = 0.0
+
+    def __len__(self):
+        return len(self._plates)
+
+    def plates(self):
+        """
+        Returns a snapshot of the normalized plates.
+        """
+        with self._lock:
+            return list(self._plates)
+
+    def refresh(self):
+        """
+        Reloads the registry if the file changed since it was last read.
+
+        Raises:
+        FileNotFoundError: If the registry file does not exist.
+        """
+        with self._refresh_lock:
+            stat = os.stat(self.path)
+            if stat.st_mtime_ns == self._mtime and stat.st_size == self._offset:
+                return
+            self._reload(stat)
+
+    def _reload(self, stat):
+        with open(self.path, 'rb') as f:
+            if self._mtime is not None and stat.st_size > self._offset and self._unchanged_prefix(f):
+                f.seek(self._offset)
+                self._load(f.read(), incremental=True)
+                self.incremental_reloads += 1
+            else:
+                self._load(f.read(), incremental=False)
+                self.reloads += 1
+        self._mtime = stat.st_mtime_ns
+
+    def _unchanged_prefix(self, f):
+        f.seek(self._offset - len(self._tail))
+        return f.read(len(self._tail)) == self._tail
+
+    def _load(self, data, incremental):
+        # Appends only consume complete lines; a partially written last line is read next time
+        end = data.rfind(b'\n') + 1 if incremental else len(data)
+        rows = csv.reader(io.StringIO(data[:end].decode('utf-8', 'replace')))
+
+        if not incremental:
+            header = next(rows, [])
+            self._column_index = header.index(self.column) if self.column in header else 0
+            self._offset = 0
+        new_plates = [normalize_plate(row[self._column_index]) for row in rows
+                      if len(row) > self._column_index and row[self._column_index]]
+
+        with self._lock:
+            if incremental:
+                self._plates.update(new_plates)
+                self.appended.extend(new_plates)
+            else:
+                self._plates = set(new_plates)
+                self._bloom = None
+                self.appended = []
+
+            if len(self._plates) < self.bloom_threshold:
+                self._bloom = None
+            elif self._bloom is None or len(self._plates) > self._bloom.capacity:
+                self._bloom = BloomFilter(2 * len(self._plates))
+                for plate in self._plates:
+                    self._bloom.add(plate)
+            else:
+                for plate in new_plates:
+                    self._bloom.add(plate)
+        self._offset += end
+        self._tail = data[max(0, end - 64):end]
+
+    def is_authorized(self, plate):
+        """
+        Returns True if the normalized plate is in the registry.
+
+        Raises:
+        FileNotFoundError: If the registry file does not exist.
+        """
+        start = time.perf_counter()
+        if start >= self._next_check:
+            self.refresh()
+            self._next_check = start + self.check_interval
+
+        plate = normalize_plate(plate)
+        with self._lock:
+            bloom, plates = self._bloom, self._plates
+        found = (bloom is None or plate in bloom) and plate in plates
+
+        elapsed = time.perf_counter() - start
+        self.lookups += 1
+        self._lookup_time += elapsed
+        self._max_lookup_time = max(self._max_lookup_time, elapsed)
+        return found
+
+    def stats(self):
+        """
+        Returns registry size, reload counters and lookup latency in microseconds.
+        """
+        return {
+            'plates': len(self._plates),
+            'bloom_filter': self._bloom is not None,
+            'reloads': self.reloads,
+            'incremental_reloads': self.incremental_reloads,
+            'lookups': self.lookups,
+            'mean_lookup_us': self._lookup_time / self.lookups * 1e6 if self.lookups else 0.0,
+            'max_lookup_us': self._max_lookup_time * 1e6,
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Returns the process-wide index of datasets/authorized_vehicles.csv.
+    """
+    global _index
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AuthorizationIndex()
+    return _index
@@ -0,0 +1,313 @@
+"""
+Benchmarks for detection, OCR, plate analysis, slot allocation and the insights queries.
+
+Runs on the CPU without network access. Detection uses detect.tflite when
+DETECT_MODEL points at a model, otherwise a tiny stand-in model: a generated
+TFLite model if TensorFlow is installed, else a NumPy stand-in interpreter. OCR is
+benchmarked with tesseract when it is installed. The insights queries run against
+parking databases built from generaatorNew.py datasets of several sizes. Slot
+allocation is timed on a morning rush of arrivals at campus-sized lots.
+
+Usage, from the repository root:
+    python benchmarks/bench.py                   # run and compare with baseline.json
+    python benchmarks/bench.py --save-baseline   # run and store the results as the baseline
+    python benchmarks/bench.py --sizes small,medium,large --check
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detect  # noqa: E402
+import generaatorNew  # noqa: E402
+import interpreter_pool  # noqa: E402
+import ocr  # noqa: E402
+import occupancy_index  # noqa: E402
+import plates  # noqa: E402
+import slot_allocator  # noqa: E402
+import storage  # noqa: E402
+import stand_in  # noqa: E402
+
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Workload generator settings per dataset size: days, mean arrivals per day, slots
+DATASET_SIZES = {
+    'small': (197, 100, 15),
+    'medium': (365, 1_000, 150),
+    'large': (730, 10_000, 1_500),
+}
+dataset_start = datetime(2024, 1, 1)
+
+# Slots per lot and arrivals in one morning rush for the slot allocator benchmark
+rush_capacities = {'A': 1_500, 'B': 1_500, 'C': 1_500, 'D': 1_500, 'Visitor': 500}
+rush_arrivals = 6_000
+rush_threads = 8
+
+
+def measure(func, iterations, warmup=5):
+    """
+    Calls func warmup times untimed, then iterations times.
+
+    Returns:
+    list: Duration of each timed call in seconds.
+    """
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations, items=1):
+    """
+    Returns latency percentiles in milliseconds and throughput in items per second,
+    where each call processes items items.
+    """
+    ms = np.array(durations) * 1000
+    return {
+        'calls': len(durations),
+        'items_per_call': items,
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'items_per_s': items * len(durations) / sum(durations) if sum(durations) else 0.0,
+    }
+
+
+def setup_detection(workdir):
+    """
+    Points detect.py at a stand-in model unless DETECT_MODEL is set and picks the OCR engine.
+
+    Returns:
+    tuple: Names of the model and of the OCR engine in use.
+    """
+    if 'DETECT_MODEL' in os.environ:
+        model = detect.model_path
+    else:
+        detect.model_path = os.path.join(workdir, 'stand_in.tflite')
+        if stand_in.build_tflite_model(detect.model_path):
+            model = 'stand-in tflite'
+        else:
+            interpreter_pool.set_interpreter_class(stand_in.StandInInterpreter)
+            model = 'stand-in numpy'
+
+    try:
+        detect.get_ocr_engine().recognize(stand_in.plate_crop('MH12AB1234'))
+        engine = type(detect.get_ocr_engine()).__name__
+    except Exception:
+        # No usable tesseract; run_batch still needs an engine for the crops
+        ocr.backends[stand_in.StandInOcrEngine.name] = stand_in.StandInOcrEngine
+        ocr.default_backend = stand_in.StandInOcrEngine.name
+        engine = None
+    detect.warmup()
+    return model, engine
+
+
+def bench_detection(results, rng, iterations, batch_size=8):
+    scenes = [stand_in.scene(rng)[0] for _ in range(batch_size)]
+    with detect.pool.checkout() as slot:
+        slot.resize_input(batch_size)
+        writer = detect.input_writer(slot)
+        results['detect.preprocess'] = summarize(measure(lambda: writer.write(scenes), iterations), batch_size)
+        results['detect.invoke'] = summarize(measure(slot.interpreter.invoke, iterations), batch_size)
+    results['detect.run_batch'] = summarize(
+        measure(lambda: detect.run_batch([image.copy() for image in scenes]), iterations), batch_size)
+
+
+def bench_ocr(results, rng, iterations, batch_size=8):
+    crops = [stand_in.plate_crop(stand_in.random_plate(rng)) for _ in range(batch_size)]
+    engine = detect.get_ocr_engine()
+    results['ocr.recognize_batch'] = summarize(measure(lambda: engine.recognize_batch(crops), iterations), batch_size)
+
+
+def bench_plates(results, rng, iterations, count=10_000):
+    import pandas as pd
+
+    texts = stand_in.ocr_texts(rng, count)
+    series = pd.Series(texts)
+    results['plates.analyze_number_plate'] = summarize(
+        measure(lambda: [plates.analyze_number_plate(text) for text in texts], iterations), count)
+    results['plates.analyze_number_plates'] = summarize(
+        measure(lambda: plates.analyze_number_plates(series), iterations), count)
+
+
+def bench_allocator(results, rng, iterations):
+    permit_types = list(slot_allocator.permit_lots)
+    lots = list(rush_capacities)
+    vehicle_types = list(slot_allocator.slot_types)
+    vehicles = [f'RUSH{i:05d}' for i in range(rush_arrivals)]
+    permits = {
+        vehicle: slot_allocator.Permit(lots[rng.integers(len(lots))],
+                                       vehicle_types[rng.choice(len(vehicle_types), p=[0.6, 0.3, 0.1])],
+                                       permit_types[rng.integers(len(permit_types))])
+        for vehicle in vehicles}
+    allocator = slot_allocator.SlotAllocator(rush_capacities, permits)
+
+    def rush(vehicles):
+        for vehicle in vehicles:
+            allocator.allocate(vehicle)
+        for vehicle in vehicles:
+            allocator.release(vehicle)
+
+    def threaded_rush():
+        # Every gate thread gets an equal share of the arrivals
+        threads = [threading.Thread(target=rush, args=(vehicles[i::rush_threads],)) for i in range(rush_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    iterations = max(3, iterations // 10)
+    results['slots.rush'] = summarize(measure(lambda: rush(vehicles), iterations), rush_arrivals)
+    results[f'slots.rush_{rush_threads}_threads'] = summarize(measure(threaded_rush, iterations), rush_arrivals)
+
+
+def build_database(workdir, size):
+    """
+    Generates a seeded sessions CSV of the given size and imports it into a new database.
+
+    Returns:
+    tuple: Database path, number of sessions and seconds spent importing.
+    """
+    days, entries_per_day, slots = DATASET_SIZES[size]
+    csv_path = os.path.join(workdir, f'sessions_{size}.csv')
+    db_path = os.path.join(workdir, f'parking_{size}.db')
+    generaatorNew.main([csv_path, '--days', str(days), '--entries-per-day', str(entries_per_day),
+                        '--slots', str(slots), '--plates', str(max(100, entries_per_day * 10)), '--seed', '0',
+                        '--start', dataset_start.strftime('%Y-%m-%d')])
+
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    count = storage.import_csvs(conn, sessions_csv=csv_path)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return db_path, count, elapsed
+
+
+def bench_insights(results, rng, iterations, workdir, size):
+    db_path, count, import_seconds = build_database(workdir, size)
+    storage.db_path = db_path
+    storage.close_connection()
+    prefix = f'insights[{size}].'
+    results[prefix + 'import_csvs'] = summarize([import_seconds], count)
+
+    days = DATASET_SIZES[size][0]
+    dates = [(dataset_start + timedelta(days=int(day))).date() for day in rng.integers(0, days, 64)]
+    moments = [dataset_start + timedelta(days=int(day), hours=int(hour))
+               for day, hour in zip(rng.integers(0, days, 64), rng.integers(0, 24, 64))]
+    vehicles = storage.get_connection().execute(
+        'SELECT vehicle_number FROM parking_sessions ORDER BY id LIMIT 64').fetchall()
+
+    def cycle(values):
+        values = list(values)
+        position = [0]
+
+        def take():
+            position[0] = (position[0] + 1) % len(values)
+            return values[position[0]]
+        return take
+
+    start = time.perf_counter()
+    index = occupancy_index.get_index()
+    results[prefix + 'occupancy_index.build'] = summarize([time.perf_counter() - start], len(index))
+
+    next_date, next_moment, next_vehicle = cycle(dates), cycle(moments), cycle(vehicles)
+    results[prefix + 'hourly_occupancy'] = summarize(
+        measure(lambda: storage.hourly_occupancy(next_date()), iterations))
+    results[prefix + 'sessions_on_date'] = summarize(
+        measure(lambda: storage.sessions_on_date(next_date()), iterations))
+    results[prefix + 'sessions_for_vehicle'] = summarize(
+        measure(lambda: storage.sessions_for_vehicle(next_vehicle()[0]), iterations))
+    results[prefix + 'occupied_at'] = summarize(measure(lambda: index.occupied_at(next_moment()), iterations))
+    results[prefix + 'timeline'] = summarize(measure(
+        lambda: index.timeline(next_moment(), next_moment() + timedelta(days=1)), iterations))
+    storage.close_connection()
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints each stage's p50 and throughput next to the baseline.
+
+    Returns:
+    list: Names of stages whose p50 latency grew by more than tolerance.
+    """
+    regressions = []
+    print(f"{'stage':48} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'items/s':>12} {'vs base':>9}")
+    for name, stats in results.items():
+        base = baseline.get(name)
+        ratio = stats['p50_ms'] / base['p50_ms'] if base and base['p50_ms'] else None
+        flag = ''
+        if ratio is not None and ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:48} {stats['p50_ms']:10.3f} {stats['p90_ms']:10.3f} {stats['p99_ms']:10.3f} "
+              f"{stats['items_per_s']:12.0f} {f'{ratio:.2f}x' if ratio is not None else '-':>9}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark detection, OCR, plate analysis, slot allocation and insights queries.')
+    parser.add_argument('--iterations', type=int, default=50, help='timed calls per stage')
+    parser.add_argument('--sizes', default='small,medium', help=f"dataset sizes from {', '.join(DATASET_SIZES)}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=baseline_path, help='baseline JSON to compare with or save to')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='p50 growth over the baseline reported as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if any stage regressed')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        model, engine = setup_detection(workdir)
+        print(f"Detection model: {model}; OCR engine: {engine or 'stand-in (tesseract not installed)'}")
+        bench_detection(results, rng, args.iterations)
+        if engine:
+            bench_ocr(results, rng, args.iterations)
+        bench_plates(results, rng, max(3, args.iterations // 10))
+        bench_allocator(results, rng, args.iterations)
+        for size in args.sizes.split(','):
+            bench_insights(results, rng, args.iterations, workdir, size.strip())
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'model': model,
+        'ocr_engine': engine,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}.")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import string
+
+import cv2
+import numpy as np
+
+import ocr
+
+# Input size of the stand-in detector
+input_size = 320
+# Boxes returned per frame, like the SSD export
+max_detections = 10
+# Pixels brighter than this (mean over RGB) belong to the plate
+plate_threshold = 200
+
+
+class StandInInterpreter:
+    """
+    NumPy stand-in for tf.lite Interpreter used when TensorFlow Lite is not installed.
+
+    It implements the parts of the Interpreter API detect.py uses and "detects" the
+    bounding box of the bright plate in each synthetic scene, with outputs laid out
+    like the SSD export: scores, boxes, count and classes.
+    """
+
+    def __init__(self, model_path=None, num_threads=None):
+        self._shape = [1, input_size, input_size, 3]
+        self._input = None
+        self._outputs = {}
+
+    def allocate_tensors(self):
+        self._input = np.zeros(self._shape, dtype=np.uint8)
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': np.array(self._shape), 'dtype': np.uint8}]
+
+    def get_output_details(self):
+        return [{'index': index} for index in (1, 2, 3, 4)]
+
+    def resize_tensor_input(self, index, shape):
+        self._shape = list(shape)
+
+    def set_tensor(self, index, value):
+        self._input[...] = value
+
+    def tensor(self, index):
+        return lambda: self._input
+
+    def invoke(self):
+        batch = self._shape[0]
+        bright = self._input.mean(axis=3) > plate_threshold
+        rows, cols = bright.any(axis=2), bright.any(axis=1)
+        found = rows.any(axis=1)
+
+        boxes = np.zeros((batch, max_detections, 4), dtype=np.float32)
+        scores = np.zeros((batch, max_detections), dtype=np.float32)
+        for i in np.flatnonzero(found):
+            ys, xs = np.flatnonzero(rows[i]), np.flatnonzero(cols[i])
+            boxes[i, 0] = (ys[0] / input_size, xs[0] / input_size, (ys[-1] + 1) / input_size,
+                           (xs[-1] + 1) / input_size)
+            scores[i, 0] = 0.999
+        self._outputs = {
+            1: scores,
+            2: boxes,
+            3: found.astype(np.float32),
+            4: np.zeros((batch, max_detections), dtype=np.float32),
+        }
+
+    def get_tensor(self, index):
+        return self._outputs[index]
+
+
+def build_tflite_model(path):
+    """
+    Writes a tiny TensorFlow Lite model with the same inputs and outputs as
+    StandInInterpreter to path.
+
+    Returns:
+    bool: False if TensorFlow is not installed.
+    """
+    try:
+        import tensorflow as tf
+    except ImportError:
+        return False
+
+    @tf.function(input_signature=[tf.TensorSpec([1, input_size, input_size, 3], tf.uint8)])
+    def detect(image):
+        bright = tf.reduce_mean(tf.cast(image, tf.float32), axis=3) > plate_threshold
+        positions = tf.range(input_size, dtype=tf.float32)
+        rows, cols = tf.reduce_any(bright, axis=2)[0], tf.reduce_any(bright, axis=1)[0]
+        ymin = tf.reduce_min(tf.where(rows, positions, float(input_size)))
+        ymax = tf.reduce_max(tf.where(rows, positions + 1, 0.0))
+        xmin = tf.reduce_min(tf.where(cols, positions, float(input_size)))
+        xmax = tf.reduce_max(tf.where(cols, positions + 1, 0.0))
+        found = tf.cast(tf.reduce_any(rows), tf.float32)
+
+        box = tf.stack([ymin, xmin, ymax, xmax]) / input_size * found
+        padding = [[0, 0], [0, max_detections - 1]]
+        # Keys sort into the SSD output order: scores, boxes, count, classes
+        return {
+            'a_scores': tf.pad(tf.reshape(0.999 * found, [1, 1]), padding),
+            'b_boxes': tf.pad(tf.reshape(box, [1, 1, 4]), padding + [[0, 0]]),
+            'c_count': tf.reshape(found, [1]),
+            'd_classes': tf.zeros([1, max_detections]),
+        }
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([detect.get_concrete_function()], detect)
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    return True
+
+
+class StandInOcrEngine(ocr.OcrEngine):
+    """
+    OCR engine used when tesseract is not installed. It binarizes the crop like a real
+    engine's first pass would and returns a fixed plate.
+    """
+
+    name = 'stand-in'
+
+    def recognize(self, roi):
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+        cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return 'MH12AB1234'
+
+
+def random_plate(rng):
+    letters = np.array(list(string.ascii_uppercase))
+    return (''.join(rng.choice(letters, 2)) + f"{rng.integers(1, 100):02d}" + ''.join(rng.choice(letters, 2))
+            + f"{rng.integers(1, 10000):04d}")
+
+
+def plate_crop(text, height=60, width=240):
+    """
+    Renders text as black characters on a white plate.
+    """
+    crop = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.putText(crop, text, (8, height - 18), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+    return crop
+
+
+def scene(rng, height=480, width=640):
+    """
+    Returns a dark, noisy BGR frame with one plate pasted at a random position, and the plate text.
+    """
+    image = rng.integers(0, 120, (height, width, 3), dtype=np.uint8)
+    text = random_plate(rng)
+    crop = plate_crop(text)
+    y = rng.integers(0, height - crop.shape[0])
+    x = rng.integers(0, width - crop.shape[1])
+    image[y:y + crop.shape[0], x:x + crop.shape[1]] = crop
+    return image, text
+
+
+def ocr_texts(rng, count):
+    """
+    Returns plate strings with the kind of noise tesseract adds: stray punctuation,
+    spaces, a leading 'I' and lowercase letters.
+    """
+    noise = np.array(list(' -|.~!()'))
+    texts = []
+    for _ in range(count):
+        text = random_plate(rng)
+        if rng.random() < 0.3:
+            text = 'I' + text
+        if rng.random() < 0.5:
+            position = rng.integers(0, len(text))
+            text = text[:position] + rng.choice(noise) + text[position:]
+        if rng.random() < 0.2:
+            text = text.lower()
+        texts.append(text)
+    return texts
@@ -0,0 +1,104 @@
+import csv
+import os
+import threading
+
+import pandas as pd
+
+import authorization
+import storage
+
+# Timestamp format written by runOcr.py
+sighting_time_format = '%Y-%m-%d %H:%M:%S'
+
+
+class Dataset:
+    """
+    A CSV dataset and how to parse it.
+
+    Parameters:
+    path (str): CSV file.
+    columns (list): Header written when the file is created by append().
+    time_columns (dict): Columns parsed to datetimes, mapped to their format.
+    dtype (dict): Column types passed to pd.read_csv.
+    """
+
+    def __init__(self, path, columns, time_columns=None, dtype=None):
+        self.path = path
+        self.columns = columns
+        self.time_columns = time_columns or {}
+        self.dtype = dtype
+
+
+DATASETS = {
+    'authorized_vehicles': Dataset(authorization.authorized_vehicles_csv, ['Plate_Number'], dtype={'Plate_Number': str}),
+    'parking_sessions': Dataset(storage.parking_sessions_csv,
+                                ['Vehicle Number', 'In Time', 'Out Time', 'Slot Number'],
+                                {'In Time': storage.csv_time_format, 'Out Time': storage.csv_time_format},
+                                {'Vehicle Number': str}),
+    'plate_sightings': Dataset('datasets/car_plate_data.csv', ['NumberPlate', 'Timestamp'],
+                               {'Timestamp': sighting_time_format}, {'NumberPlate': str}),
+    'cleaned_sightings': Dataset('datasets/car_plate_data_cleaned.csv', ['NumberPlate', 'Timestamp'],
+                                 {'Timestamp': sighting_time_format}, {'NumberPlate': str}),
+}
+
+_cache = {}
+_locks = {name: threading.Lock() for name in DATASETS}
+
+
+def _read(dataset):
+    frame = pd.read_csv(dataset.path, dtype=dataset.dtype, encoding_errors='replace')
+    for column, time_format in dataset.time_columns.items():
+        if column in frame:
+            frame[column] = pd.to_datetime(frame[column], format=time_format, errors='coerce')
+    return frame
+
+
+def load(name):
+    """
+    Returns a dataset parsed with typed timestamp columns.
+
+    Each file is read once per process and read again only when its modification time
+    or size changes. Callers get their own copy of the cached frame, so they can modify
+    it without affecting other callers. Under pandas' copy-on-write (always on since
+    pandas 3.0) that copy is shallow and the data is only copied when it is modified;
+    older pandas gets a deep copy.
+
+    Parameters:
+    name (str): One of the keys of DATASETS.
+
+    Returns:
+    DataFrame: The dataset.
+
+    Raises:
+    FileNotFoundError: If the dataset file does not exist.
+    """
+    dataset = DATASETS[name]
+    with _locks[name]:
+        stat = os.stat(dataset.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = _cache.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, _read(dataset))
+            _cache[name] = cached
+    return cached[1].copy(deep=not _copy_on_write())
+
+
+def _copy_on_write():
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return pd.get_option('mode.copy_on_write') is True
+
+
+def append(name, row):
+    """
+    Appends one row, given as a dict of column values, to a dataset file, creating it
+    with its header if needed. The next load() reads the file again.
+    """
+    dataset = DATASETS[name]
+    with _locks[name]:
+        new_file = not os.path.exists(dataset.path) or os.path.getsize(dataset.path) == 0
+        with open(dataset.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=dataset.columns)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
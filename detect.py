@@ -1,81 +1,249 @@
-import numpy as np
-import csv
-import cv2
 import os
-import pandas as pd
-import sys
-import glob
-import random
-import importlib.util
-from datetime import datetime
-import pytesseract
-from tensorflow.lite.python.interpreter import Interpreter
-
-import matplotlib
-import matplotlib.pyplot as plt
+import threading
 
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\\tesseract.exe'
-
-interpreter = Interpreter(model_path='detect.tflite')
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
-height = input_details[0]['shape'][1]
-width = input_details[0]['shape'][2]
+import cv2
+import numpy as np
 
-float_input = (input_details[0]['dtype'] == np.float32)
+import metrics
+import ocr
+from interpreter_pool import InterpreterPool
+from preprocess import InputWriter
+
+# TensorFlow Lite model file, overridable to run a different export or a stand-in model
+model_path = os.environ.get('DETECT_MODEL', 'detect.tflite')
+# Number of interpreters shared by all sessions and the threads each one uses for invoke()
+pool_size = int(os.environ.get('DETECT_POOL_SIZE', 0)) or None
+num_threads = int(os.environ.get('DETECT_NUM_THREADS', 0)) or None
+
+# The model and OCR engine are loaded on first detection by load_model(), so importing
+# this module from a page does not pull in TensorFlow or allocate tensors
+pool = None
+input_details = None
+output_details = None
+height = None
+width = None
+float_input = None
+_load_lock = threading.Lock()
+_warmup_started = False
 
 input_mean = 127.5
 input_std = 127.5
 min_conf = 0.99
 
-def run(image):
+# Largest number of frames pushed through the interpreter in one invoke() by run_batch
+max_batch_size = 8
+
+# Tesseract settings for plate crops: a single word of uppercase letters and digits
+ocr_psm = 8
+ocr_oem = 3
+
+
+def load_model():
     """
-    Predicts and plots the bounding boxes on the given image using the trained TensorFlow Lite model.
-    Also performs OCR on the detected bounding boxes to extract text.
+    Creates the interpreter pool on first use and reads the model's input geometry.
+
+    Returns:
+    InterpreterPool: The process-wide pool of interpreters.
+    """
+    global pool, input_details, output_details, height, width, float_input
+
+    if pool is None:
+        with _load_lock:
+            if pool is None:
+                new_pool = InterpreterPool(model_path, size=pool_size, num_threads=num_threads)
+                input_details = new_pool.input_details
+                output_details = new_pool.output_details
+                height = input_details[0]['shape'][1]
+                width = input_details[0]['shape'][2]
+                float_input = (input_details[0]['dtype'] == np.float32)
+                pool = new_pool
+    return pool
+
+
+def warmup(background=False):
+    """
+    Loads the model and runs one blank frame through every interpreter ahead of the first detection.
 
     Parameters:
-    image (ndarray): Image array in BGR format (OpenCV).
+    background (bool): If True, warm up on a daemon thread and return immediately.
+    """
+    global _warmup_started
 
-    Returns:
-    tuple: A tuple containing the processed image with bounding boxes and a list of detected texts.
+    with _load_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+    if background:
+        threading.Thread(target=_warmup, daemon=True).start()
+    else:
+        _warmup()
+
+
+def _warmup():
+    load_model().warmup()
+    get_ocr_engine()
+
+
+def get_ocr_engine():
     """
+    Returns the shared OCR engine configured for plate crops.
+    """
+    return ocr.get_engine(psm=ocr_psm, oem=ocr_oem, whitelist=ocr.PLATE_WHITELIST)
+
+
+def input_writer(slot):
+    """
+    Returns the InputWriter of a pooled interpreter, creating it on first use.
+    """
+    if slot.writer is None:
+        slot.writer = InputWriter(slot.interpreter, input_details[0], input_mean, input_std)
+    return slot.writer
 
-    # Resize and preprocess the image
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    imH, imW, _ = image.shape
-    image_resized = cv2.resize(image_rgb, (width, height))
-    input_data = np.expand_dims(image_resized, axis=0)
-    if float_input:
-        input_data = (np.float32(input_data) - input_mean) / input_std
 
-    # Perform inference with the TensorFlow Lite model
-    interpreter.set_tensor(input_details[0]['index'], input_data)
-    interpreter.invoke()
+def invoke(images):
+    """
+    Runs the model on a batch of images using an interpreter checked out from the pool.
 
-    boxes = interpreter.get_tensor(output_details[1]['index'])[0]  # Bounding box coordinates of detected objects
-    classes = interpreter.get_tensor(output_details[3]['index'])[0]  # Class index of detected objects
-    scores = interpreter.get_tensor(output_details[0]['index'])[0]  # Confidence of detected objects
+    The frames are resized and normalized straight into the interpreter's input tensor.
+
+    Parameters:
+    images (list): Image arrays in BGR format (OpenCV).
+
+    Returns:
+    tuple: Boxes, classes and scores arrays, each with the batch as the first dimension.
+    """
+    with load_model().checkout() as slot:
+        if len(images) > 1 and slot.resize_input(len(images)):
+            try:
+                boxes, classes, scores = invoke_on(slot, images)
+                if boxes.shape[0] == scores.shape[0] == len(images):
+                    return boxes, classes, scores
+            except (RuntimeError, ValueError):
+                # Post-processing ops such as TFLite_Detection_PostProcess may only fail once invoked
+                pass
+            # The model accepted the batched input but cannot run it; stay at one frame from now on
+            slot.disable_batching()
+        # Fall back to one invoke() per frame on the same interpreter
+        slot.resize_input(1)
+        results = [invoke_on(slot, images[i:i + 1]) for i in range(len(images))]
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def invoke_on(slot, images):
+    interpreter = slot.interpreter
+    input_writer(slot).write(images)
+    with metrics.timer('detect.invoke'):
+        interpreter.invoke()
+
+    boxes = interpreter.get_tensor(output_details[1]['index'])  # Bounding box coordinates of detected objects
+    classes = interpreter.get_tensor(output_details[3]['index'])  # Class index of detected objects
+    scores = interpreter.get_tensor(output_details[0]['index'])  # Confidence of detected objects
+    return boxes, classes, scores
+
+
+def extract_boxes(image, boxes, scores):
+    """
+    Converts normalized model boxes above min_conf into pixel coordinates clipped to the image.
 
-    detected_texts = []  # Initialize a list to store detected texts
+    Parameters:
+    image (ndarray): Image the boxes were predicted for.
+    boxes (ndarray): Normalized (ymin, xmin, ymax, xmax) boxes for this image.
+    scores (ndarray): Confidence for each box.
 
-    # Extract the bounding boxes and labels from the results
+    Returns:
+    list: (xmin, ymin, xmax, ymax) tuples in pixels.
+    """
+    imH, imW, _ = image.shape
+    pixel_boxes = []
     for i in range(len(scores)):
         if ((scores[i] > min_conf) and (scores[i] <= 1.0)):
-            # Get bounding box coordinates and draw box
             # Interpreter can return coordinates that are outside of image dimensions, need to force them to be within image using max() and min()
             ymin = int(max(1, (boxes[i][0] * imH)))
             xmin = int(max(1, (boxes[i][1] * imW)))
             ymax = int(min(imH, (boxes[i][2] * imH)))
             xmax = int(min(imW, (boxes[i][3] * imW)))
-            cv2.rectangle(image, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+            pixel_boxes.append((xmin, ymin, xmax, ymax))
+    return pixel_boxes
+
 
-            # Crop the bounding box from the image for OCR
-            roi = image[ymin:ymax, xmin:xmax]
+def crop_plates(image, pixel_boxes):
+    """
+    Draws the boxes on the image and crops each boxed region for OCR.
+
+    Parameters:
+    image (ndarray): Image array in BGR format (OpenCV), modified in place.
+    pixel_boxes (list): Output of extract_boxes().
 
-            # Perform OCR on the cropped image
-            text = pytesseract.image_to_string(roi, config='-c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ --psm 8 --oem 3')
-            detected_texts.append(text)  # Append detected text to the list
+    Returns:
+    list: Cropped region for each box.
+    """
+    rois = []
+    for xmin, ymin, xmax, ymax in pixel_boxes:
+        cv2.rectangle(image, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
 
-    # Return both the modified image with bounding boxes and the detected texts
+        # Crop the bounding box from the image for OCR
+        rois.append(image[ymin:ymax, xmin:xmax])
+    return rois
+
+
+def run(image):
+    """
+    Predicts and plots the bounding boxes on the given image using the trained TensorFlow Lite model.
+    Also performs OCR on the detected bounding boxes to extract text.
+
+    Parameters:
+    image (ndarray): Image array in BGR format (OpenCV).
+
+    Returns:
+    tuple: A tuple containing the processed image with bounding boxes and a list of detected texts.
+    """
+    image, _, detected_texts = run_batch([image])[0]
     return image, detected_texts
+
+
+def detect_boxes(images, batch_size=None):
+    """
+    Runs the model on several images, pushing up to batch_size frames through one invoke().
+
+    Parameters:
+    images (list): Image arrays in BGR format (OpenCV).
+    batch_size (int): Frames per invoke(), defaults to max_batch_size.
+
+    Returns:
+    list: One (boxes, scores) pair per input image, where boxes are the (xmin, ymin, xmax, ymax)
+    pixel tuples of the detections above min_conf and scores their confidences.
+    """
+    load_model()
+    batch_size = batch_size or max_batch_size
+    detections = []
+    for start in range(0, len(images), batch_size):
+        chunk = images[start:start + batch_size]
+        boxes, classes, scores = invoke(chunk)
+        with metrics.timer('detect.boxes'):
+            for i, image in enumerate(chunk):
+                detections.append((extract_boxes(image, boxes[i], scores[i]),
+                                   [float(score) for score in scores[i] if min_conf < score <= 1.0]))
+    return detections
+
+
+def run_batch(images, batch_size=None):
+    """
+    Runs detection and OCR on several images, pushing up to batch_size frames through one invoke().
+
+    Parameters:
+    images (list): Image arrays in BGR format (OpenCV).
+    batch_size (int): Frames per invoke(), defaults to max_batch_size.
+
+    Returns:
+    list: One (image, boxes, texts) tuple per input image, where image has the boxes drawn on it,
+    boxes are (xmin, ymin, xmax, ymax) pixel tuples and texts are the OCR results for those boxes.
+    """
+    detections = [(image, pixel_boxes) for image, (pixel_boxes, _) in zip(images, detect_boxes(images, batch_size))]
+    rois = []
+    for image, pixel_boxes in detections:
+        rois.extend(crop_plates(image, pixel_boxes))
+
+    # Perform OCR on the plates of all images in one batch
+    with metrics.timer('detect.ocr'):
+        texts = iter(get_ocr_engine().recognize_batch(rois))
+    return [(image, pixel_boxes, [next(texts) for _ in pixel_boxes]) for image, pixel_boxes in detections]
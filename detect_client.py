@@ -0,0 +1,142 @@
+import http.client
+import json
+import os
+import socket
+import threading
+from urllib.parse import urlsplit
+
+import numpy as np
+
+import detect
+
+# Address of a running detect_server.py, e.g. http://127.0.0.1:8765 or unix:///tmp/detect.sock.
+# When unset, detection runs in this process through detect.py.
+server_url = os.environ.get('DETECT_SERVER_URL') or None
+timeout = float(os.environ.get('DETECT_SERVER_TIMEOUT', 30))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DetectClient:
+    """
+    Client of detect_server.py. Each thread keeps its own keep-alive connection.
+    """
+
+    def __init__(self, url, timeout=timeout):
+        self.url = urlsplit(url)
+        if self.url.scheme not in ('http', 'unix'):
+            raise ValueError(f"server URL must start with http:// or unix://, not {url!r}")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        if self.url.scheme == 'unix':
+            return _UnixHTTPConnection(self.url.path, timeout=self.timeout)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+
+    def _request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = self._connect()
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed the idle keep-alive connection; retry once on a new one
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"detection server returned {response.status}: {data.decode(errors='replace')}")
+        return data
+
+    def detect(self, images, ocr=True):
+        """
+        Sends images to the server, which batches them with other clients' requests.
+
+        Parameters:
+        images (list): Image arrays in BGR format (OpenCV).
+        ocr (bool): Whether to read the text of the detected plates.
+
+        Returns:
+        list: One dict per image with its boxes and scores, and its texts if ocr is True.
+        """
+        if not images:
+            return []
+        frames = [np.ascontiguousarray(image, dtype=np.uint8) for image in images]
+        headers = {
+            'Content-Type': 'application/octet-stream',
+            'Content-Length': str(sum(frame.nbytes for frame in frames)),
+            'X-Frame-Shapes': ';'.join(','.join(str(n) for n in frame.shape) for frame in frames),
+        }
+        data = self._request('POST', '/detect' if ocr else '/detect?ocr=0',
+                             body=[frame.data.cast('B') for frame in frames], headers=headers)
+        results = json.loads(data)['results']
+        for result in results:
+            result['boxes'] = [tuple(box) for box in result['boxes']]
+        return results
+
+    def stats(self):
+        return json.loads(self._request('GET', '/stats'))
+
+
+def get_client():
+    """
+    Returns the shared client of the server at server_url, or None when no server is configured.
+    """
+    global _client
+
+    if server_url is None:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DetectClient(server_url)
+    return _client
+
+
+def warmup(background=False):
+    """
+    Loads the local model ahead of the first detection; the server's model is already warm.
+    """
+    if server_url is None:
+        detect.warmup(background=background)
+
+
+def detect_boxes(images, batch_size=None):
+    """
+    Same as detect.detect_boxes, on the detection server when one is configured.
+    """
+    client = get_client()
+    if client is None:
+        return detect.detect_boxes(images, batch_size)
+    return [(result['boxes'], result['scores']) for result in client.detect(images, ocr=False)]
+
+
+def run_batch(images, batch_size=None):
+    """
+    Same as detect.run_batch, on the detection server when one is configured.
+    """
+    client = get_client()
+    if client is None:
+        return detect.run_batch(images, batch_size)
+    results = client.detect(images)
+    for image, result in zip(images, results):
+        detect.crop_plates(image, result['boxes'])
+    return [(image, result['boxes'], result['texts']) for image, result in zip(images, results)]
@@ -0,0 +1,343 @@
+"""
+Local detection server, so several Streamlit processes and runOcr.py share one
+warm model instead of each loading their own.
+
+Concurrent requests are coalesced into micro-batches: a batch is run once it
+holds max_batch_size frames or max_delay seconds after its first request
+arrived, whichever comes first. One scheduler thread per pooled interpreter
+forms and runs batches, so batches run in parallel up to the pool size.
+
+Endpoints:
+    POST /detect     Raw BGR frames, concatenated, with their shapes in the X-Frame-Shapes
+                     header as "h,w,c;h,w,c". Add ?ocr=0 to skip OCR. Returns
+                     {"results": [{"boxes": [...], "scores": [...], "texts": [...]}, ...]}.
+    GET /stats       Queue depth, batch size and request counters as JSON.
+    GET /metrics     Per-stage timings and the scheduler counters in the Prometheus text format.
+    GET /health      200 once the model is loaded.
+
+Usage:
+    python detect_server.py --url http://127.0.0.1:8765
+    python detect_server.py --url unix:///tmp/detect.sock
+"""
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import detect
+import metrics
+
+server_url = os.environ.get('DETECT_SERVER_URL', 'http://127.0.0.1:8765')
+# Longest a request waits for other requests to share its batch
+max_delay = float(os.environ.get('DETECT_SERVER_MAX_DELAY_MS', 10)) / 1000
+# Upper bounds of the batch size histogram exported on /metrics
+batch_size_buckets = (1, 2, 4, 8, 16, 32)
+
+
+class _Request:
+    __slots__ = ('frames', 'ocr', 'arrived', 'results', 'error', 'done')
+
+    def __init__(self, frames, ocr):
+        self.frames = frames
+        self.ocr = ocr
+        self.arrived = time.perf_counter()
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent detection requests into batches for detect.py.
+    """
+
+    def __init__(self, max_batch_size=None, max_delay=max_delay, workers=None):
+        """
+        Parameters:
+        max_batch_size (int): Frames at which a batch is run without waiting, defaults to detect.max_batch_size.
+        max_delay (float): Seconds a request waits for more frames before its batch is run.
+        workers (int): Scheduler threads, defaults to the size of detect.py's interpreter pool.
+        """
+        self.max_batch_size = max_batch_size or detect.max_batch_size
+        self.max_delay = max_delay
+        self.workers = workers or detect.load_model().size
+
+        self._queue = deque()
+        self._queued_frames = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = []
+
+        self.requests = 0
+        self.frames = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = Counter()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'detect-batcher-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, frames, ocr=True):
+        """
+        Queues frames for the next batch and waits for their results.
+
+        Returns:
+        list: One dict per frame with its boxes and scores, and its texts if ocr is True.
+        """
+        request = _Request(frames, ocr)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("detection server is shutting down")
+            self._queue.append(request)
+            self._queued_frames += len(frames)
+            self.requests += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queued_frames)
+            self._cond.notify_all()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _take_batch(self):
+        # Waits for a request, then for max_batch_size frames or the oldest request's deadline
+        with self._cond:
+            while True:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return []
+                remaining = self._queue[0].arrived + self.max_delay - time.perf_counter()
+                if self._queued_frames >= self.max_batch_size or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+
+            batch = [self._queue.popleft()]
+            frames = len(batch[0].frames)
+            while self._queue and frames + len(self._queue[0].frames) <= self.max_batch_size:
+                batch.append(self._queue.popleft())
+                frames += len(batch[-1].frames)
+            self._queued_frames -= frames
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                with self._cond:
+                    if self._closed and not self._queue:
+                        return
+                continue
+            started = time.perf_counter()
+            for request in batch:
+                metrics.observe('server.queue_wait', started - request.arrived)
+            try:
+                self._process(batch)
+            except Exception as error:
+                for request in batch:
+                    request.error = error
+            for request in batch:
+                request.done.set()
+            metrics.observe('server.batch', time.perf_counter() - started)
+
+    def _process(self, batch):
+        frames = [frame for request in batch for frame in request.frames]
+        with self._cond:
+            self.batches += 1
+            self.frames += len(frames)
+            self.batch_sizes[len(frames)] += 1
+
+        detections = iter(detect.detect_boxes(frames, batch_size=self.max_batch_size))
+        rois = []
+        for request in batch:
+            request.results = []
+            for frame in request.frames:
+                boxes, scores = next(detections)
+                request.results.append({'boxes': boxes, 'scores': scores})
+                if request.ocr:
+                    rois.extend(detect.crop_plates(frame, boxes))
+
+        # OCR the plates of every request that asked for it in one call
+        with metrics.timer('detect.ocr'):
+            texts = iter(detect.get_ocr_engine().recognize_batch(rois))
+        for request in batch:
+            if request.ocr:
+                for result in request.results:
+                    result['texts'] = [next(texts) for _ in result['boxes']]
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'max_batch_size': self.max_batch_size,
+                'max_delay_ms': self.max_delay * 1000,
+                'queue_depth': self._queued_frames,
+                'max_queue_depth': self.max_queue_depth,
+                'requests': self.requests,
+                'frames': self.frames,
+                'batches': self.batches,
+                'mean_batch_size': self.frames / self.batches if self.batches else 0.0,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            }
+
+    def prometheus_text(self):
+        """
+        Renders the queue depth gauge and the batch size histogram in the Prometheus text format.
+        """
+        stats = self.stats()
+        lines = ['# HELP detect_server_queue_depth Frames waiting for a batch.',
+                 '# TYPE detect_server_queue_depth gauge',
+                 f"detect_server_queue_depth {stats['queue_depth']}",
+                 '# HELP detect_server_batch_size Frames per batch run by the model.',
+                 '# TYPE detect_server_batch_size histogram']
+        for bound in batch_size_buckets:
+            count = sum(n for size, n in stats['batch_sizes'].items() if size <= bound)
+            lines.append(f'detect_server_batch_size_bucket{{le="{bound}"}} {count}')
+        lines.append(f"detect_server_batch_size_bucket{{le=\"+Inf\"}} {stats['batches']}")
+        lines.append(f"detect_server_batch_size_sum {stats['frames']}")
+        lines.append(f"detect_server_batch_size_count {stats['batches']}")
+        return '\n'.join(lines) + '\n'
+
+
+def parse_frame_shapes(header):
+    """
+    Parses an X-Frame-Shapes header such as "480,640,3;720,1280,3".
+
+    Raises:
+    ValueError: If a shape is not three positive integers with 3 channels.
+    """
+    shapes = []
+    for part in header.split(';'):
+        shape = tuple(int(n) for n in part.split(','))
+        if len(shape) != 3 or shape[2] != 3 or min(shape) <= 0:
+            raise ValueError(f"frame shape must be height,width,3, not {part!r}")
+        shapes.append(shape)
+    return shapes
+
+
+class DetectHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    batcher = None
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, b'ok', 'text/plain')
+        elif self.path == '/stats':
+            stats = dict(self.batcher.stats(), pool=detect.pool.stats())
+            self._reply(200, json.dumps(stats).encode(), 'application/json')
+        elif self.path == '/metrics':
+            text = metrics.prometheus_text() + self.batcher.prometheus_text()
+            self._reply(200, text.encode(), 'text/plain; version=0.0.4')
+        else:
+            self._reply(404, b'not found', 'text/plain')
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/detect':
+            self._reply(404, b'not found', 'text/plain')
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        body = bytearray(length)
+        view = memoryview(body)
+        received = 0
+        while received < length:
+            n = self.rfile.readinto(view[received:])
+            if not n:
+                break
+            received += n
+
+        try:
+            shapes = parse_frame_shapes(self.headers.get('X-Frame-Shapes', ''))
+            if sum(int(np.prod(shape)) for shape in shapes) != received:
+                raise ValueError("body length does not match X-Frame-Shapes")
+        except ValueError as error:
+            self._reply(400, str(error).encode(), 'text/plain')
+            return
+
+        frames = []
+        offset = 0
+        for shape in shapes:
+            size = int(np.prod(shape))
+            frames.append(np.frombuffer(body, dtype=np.uint8, count=size, offset=offset).reshape(shape))
+            offset += size
+        ocr = parse_qs(url.query).get('ocr', ['1'])[0] != '0'
+        try:
+            results = self.batcher.submit(frames, ocr=ocr)
+        except Exception as error:
+            self._reply(500, f'{type(error).__name__}: {error}'.encode(), 'text/plain')
+            return
+        self._reply(200, json.dumps({'results': results}).encode(), 'application/json')
+
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(url, batcher):
+    """
+    Creates the HTTP server for url, an http://host:port or unix:///path address.
+
+    Returns:
+    socketserver.BaseServer: The server; call serve_forever() to handle requests.
+    """
+    handler = type('Handler', (DetectHandler,), {'batcher': batcher})
+    address = urlsplit(url)
+    if address.scheme == 'unix':
+        if os.path.exists(address.path):
+            os.unlink(address.path)
+        return ThreadingUnixHTTPServer(address.path, handler)
+    if address.scheme != 'http':
+        raise ValueError(f"server URL must start with http:// or unix://, not {url!r}")
+    return ThreadingHTTPServer((address.hostname, address.port or 80), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve plate detection to local clients.')
+    parser.add_argument('--url', default=server_url, help='http://host:port or unix:///path to listen on')
+    parser.add_argument('--max-delay-ms', type=float, default=max_delay * 1000,
+                        help='longest a request waits to share a batch')
+    parser.add_argument('--max-batch-size', type=int, default=detect.max_batch_size)
+    args = parser.parse_args(argv)
+
+    metrics.enable()
+    detect.warmup()
+    batcher = MicroBatcher(max_batch_size=args.max_batch_size, max_delay=args.max_delay_ms / 1000).start()
+    server = serve(args.url, batcher)
+    print(f"Detection server listening on {args.url} with {batcher.workers} interpreters")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,18 @@
-import csv
-import random
+import argparse
+import heapq
+import os
+import string
+import sys
+import time
 from datetime import datetime, timedelta
 
-# Number of days to simulate
-num_days = 197
-# Number of entries per day
-entries_per_day = 100
-# Start date for simulation
-start_date = datetime(2024, 1, 1)  # Change as needed
+import numpy as np
+import pandas as pd
+
+from plates import state_codes
+
+# Timestamp format read by storage.py
+time_format = '%m-%d-%Y %H:%M:%S'
 # List of authorized vehicle numbers
 authorized_vehicle_numbers = [
     "MH46X9996", "MH14EU3498", "DL3CAY9324", "MH12JC2813", "HR696969",
@@ -17,56 +22,239 @@ authorized_vehicle_numbers = [
     "MH20BY3665", "KL43B2344", "MH20EE7597", "HR26CM6005", "MH02CT2727",
     "MH20BG20", "HR26DG6167"
 ]
+# Vehicles arrive between 08:00:00 and 18:59:59
+first_arrival = 8 * 3600
+last_arrival = 19 * 3600 - 1
+# Longest stay is 3 days and 6 hours, so out times fall at most this many days after the in date
+max_stay_days = 4
+
+_epoch = datetime(1970, 1, 1)
+
+
+def plate_population(size, rng):
+    """
+    Returns size vehicle numbers: the authorized vehicles first, then random plates
+    made of a state code, a district number, a series and a four digit number.
+    """
+    plates = authorized_vehicle_numbers[:size]
+    extra = size - len(plates)
+    if extra > 0:
+        codes = np.array(sorted(state_codes))
+        letters = np.array(list(string.ascii_uppercase))
+        plates += list(pd.Series(codes[rng.integers(0, len(codes), extra)])
+                       + pd.Series(rng.integers(1, 100, extra)).astype(str).str.zfill(2)
+                       + pd.Series(letters[rng.integers(0, 26, extra)])
+                       + pd.Series(letters[rng.integers(0, 26, extra)])
+                       + pd.Series(rng.integers(1, 10000, extra)).astype(str).str.zfill(4))
+    return np.array(plates, dtype=object)
+
+
+def parse_lots(spec, slots):
+    """
+    Parses 'A:50,B:30' into [('A', 50), ('B', 30)]. Without a spec there is a single
+    unnamed lot with the given number of slots.
+    """
+    if not spec:
+        return [(None, slots)]
+    lots = []
+    for part in spec.split(','):
+        name, _, count = part.partition(':')
+        lots.append((name.strip(), int(count)))
+    return lots
+
+
+class SlotAllocator:
+    """
+    Assigns every arriving vehicle the lowest numbered free slot of its lot.
+
+    Occupied slots sit in a heap keyed by the time they are freed and free slots in a
+    heap keyed by slot number, so each arrival costs O(log slots) instead of a scan of
+    every earlier session. Arrivals must come in time order. Slot numbers run on
+    across lots, so they are unique in the whole dataset.
+    """
+
+    def __init__(self, lots):
+        self.free = []
+        self.busy = []
+        first = 1
+        for _, count in lots:
+            self.free.append(list(range(first, first + count)))
+            self.busy.append([])
+            first += count
+
+    def allocate(self, lot, in_time, out_time):
+        """
+        Returns the slot given to a vehicle parked from in_time to out_time, or 0 if the lot is full.
+        """
+        free, busy = self.free[lot], self.busy[lot]
+        while busy and busy[0][0] <= in_time:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if not free:
+            return 0
+        slot = heapq.heappop(free)
+        heapq.heappush(busy, (out_time, slot))
+        return slot
+
+
+def _time_of_day_strings():
+    seconds = np.arange(86400)
+    return np.char.add(np.char.add(
+        np.char.zfill((seconds // 3600).astype(str), 2),
+        np.char.add(':', np.char.zfill((seconds // 60 % 60).astype(str), 2))),
+        np.char.add(':', np.char.zfill((seconds % 60).astype(str), 2)))
+
+
+def generate(days, entries_per_day, lots, plates, start_date, rng):
+    """
+    Simulates one day at a time and yields the sessions of each day as a DataFrame.
+
+    The number of arrivals per day is Poisson distributed around entries_per_day.
+    80% of vehicles leave 1 to 6 hours after arriving, the rest 1 to 3 days and 1 to
+    6 hours later. Each vehicle picks a lot in proportion to its slots and is turned
+    away when that lot is full.
+
+    Parameters:
+    days (int): Number of days to simulate.
+    entries_per_day (float): Mean number of arrivals per day.
+    lots (list): (name, slots) of each parking lot.
+    plates (ndarray): Vehicle numbers to draw from.
+    start_date (datetime): First simulated day.
+    rng (numpy.random.Generator): Source of randomness.
+    """
+    allocator = SlotAllocator(lots)
+    capacities = np.array([count for _, count in lots], dtype=float)
+    lot_names = np.array([name for name, _ in lots], dtype=object)
+    start = int((start_date - _epoch).total_seconds()) // 86400 * 86400
+
+    for day in range(days):
+        count = rng.poisson(entries_per_day)
+        arrivals = np.sort(rng.integers(first_arrival, last_arrival + 1, count)) + start + day * 86400
+        same_day = rng.random(count) < 0.8
+        stays = (rng.integers(1, 7, count) * 3600
+                 + np.where(same_day, 0, rng.integers(1, 4, count) * 86400))
+        departures = arrivals + stays
+        vehicles = rng.integers(0, len(plates), count)
+        lot_choice = rng.choice(len(lots), count, p=capacities / capacities.sum())
+
+        slots = np.fromiter(
+            (allocator.allocate(lot, in_time, out_time)
+             for lot, in_time, out_time in zip(lot_choice.tolist(), arrivals.tolist(), departures.tolist())),
+            dtype=np.int64, count=count)
+        parked = slots > 0
+        sessions = {
+            'Vehicle Number': plates[vehicles[parked]],
+            'In Time': arrivals[parked],
+            'Out Time': departures[parked],
+            'Slot Number': slots[parked],
+        }
+        if lot_names[0] is not None:
+            sessions['Parking Lot'] = lot_names[lot_choice[parked]]
+        yield pd.DataFrame(sessions)
+
+
+class CsvSink:
+    """
+    Appends session chunks to a CSV file in the format of indian_vehicle_parking_data.csv.
+
+    Timestamps are assembled from lookup tables of date and time-of-day strings,
+    which is much faster than strftime on every row.
+    """
+
+    def __init__(self, path, start_date, days):
+        self.file = open(path, 'w', newline='')
+        self.header = True
+        self.first_day = int((start_date - _epoch).total_seconds()) // 86400
+        dates = pd.date_range(start_date.date(), periods=days + max_stay_days + 1, freq='D')
+        self.dates = np.char.add(dates.strftime('%m-%d-%Y').to_numpy(dtype=str), ' ')
+        self.times = _time_of_day_strings()
+
+    def _format(self, seconds):
+        return np.char.add(self.dates[seconds // 86400 - self.first_day], self.times[seconds % 86400])
+
+    def write(self, chunk):
+        chunk = chunk.assign(**{'In Time': self._format(chunk['In Time'].to_numpy()),
+                                'Out Time': self._format(chunk['Out Time'].to_numpy())})
+        chunk.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """
+    Appends session chunks to a Parquet file as row groups, with typed timestamp columns.
+    """
+
+    def __init__(self, path):
+        import pyarrow.parquet
+        self.path = path
+        self.parquet = pyarrow.parquet
+        self.writer = None
+
+    def write(self, chunk):
+        import pyarrow
+        chunk = chunk.assign(**{'In Time': chunk['In Time'].to_numpy().astype('datetime64[s]'),
+                                'Out Time': chunk['Out Time'].to_numpy().astype('datetime64[s]')})
+        table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic parking sessions dataset.')
+    parser.add_argument('output', nargs='?', default='datasets/indian_vehicle_parking_data.csv',
+                        help='.csv or .parquet file to write')
+    parser.add_argument('--days', type=int, default=197, help='number of days to simulate')
+    parser.add_argument('--entries-per-day', type=float, default=100, help='mean arrivals per day')
+    parser.add_argument('--slots', type=int, default=15, help='slots of the lot when --lots is not given')
+    parser.add_argument('--lots', help="lots and their slots, e.g. 'A:50,B:50,Visitor:20'; "
+                                       "adds a Parking Lot column")
+    parser.add_argument('--plates', type=int, default=len(authorized_vehicle_numbers),
+                        help='number of distinct vehicles; beyond the authorized ones plates are random')
+    parser.add_argument('--start', default='2024-01-01', help='first simulated day, YYYY-MM-DD')
+    parser.add_argument('--seed', type=int, default=0, help='random seed; the same seed gives the same dataset')
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000, help='rows buffered before each write')
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    start_date = datetime.strptime(args.start, '%Y-%m-%d')
+    lots = parse_lots(args.lots, args.slots)
+    plates = plate_population(args.plates, rng)
+
+    if os.path.splitext(args.output)[1] == '.parquet':
+        sink = ParquetSink(args.output)
+    else:
+        sink = CsvSink(args.output, start_date, args.days)
+
+    begin = time.perf_counter()
+    rows = 0
+    pending = []
+    pending_rows = 0
+    try:
+        for sessions in generate(args.days, args.entries_per_day, lots, plates, start_date, rng):
+            pending.append(sessions)
+            pending_rows += len(sessions)
+            if pending_rows >= args.chunk_rows:
+                sink.write(pd.concat(pending, ignore_index=True))
+                rows += pending_rows
+                pending, pending_rows = [], 0
+        if pending:
+            sink.write(pd.concat(pending, ignore_index=True))
+            rows += pending_rows
+    finally:
+        sink.close()
+
+    elapsed = time.perf_counter() - begin
+    end_date = start_date + timedelta(days=args.days - 1)
+    print(f"Generated {rows} parking sessions from {start_date.date()} to {end_date.date()} into "
+          f"{args.output} in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s).", file=sys.stderr)
 
 
-# Function to generate random datetime within a specific date range
-def random_datetime(date):
-    return datetime(date.year, date.month, date.day, random.randint(8, 18), random.randint(0, 59),
-                    random.randint(0, 59))
-
-
-# Function to check if the new time slot overlaps with existing slots for the given parking slot
-def is_time_slot_available(slot, in_time, out_time, slot_usage):
-    for existing_in_time, existing_out_time in slot_usage.get(slot, []):
-        if not (out_time <= existing_in_time or in_time >= existing_out_time):
-            return False
-    return True
-
-
-# Generate dummy data
-data = []
-slot_usage = {i: [] for i in range(1, 16)}  # Initialize usage dictionary for 100 slots
-for i in range(num_days):
-    current_date = start_date + timedelta(days=i)
-    for _ in range(entries_per_day):
-        vehicle_number = random.choice(authorized_vehicle_numbers)
-        in_time = random_datetime(current_date)
-
-        # Randomly decide whether out time is on the same day or different day
-        if random.random() < 0.8:  # 80% chance of same day out time
-            out_time = in_time + timedelta(hours=random.randint(1, 6))
-        else:  # 20% chance of different day out time
-            out_time = in_time + timedelta(days=random.randint(1, 3), hours=random.randint(1, 6))
-        # Find a free slot
-        available_slot = None
-        for slot in range(1, 16):
-            if is_time_slot_available(slot, in_time, out_time, slot_usage):
-                available_slot = slot
-                break
-
-        # If no slots are available, skip this entry
-        if available_slot is None:
-            continue
-
-        # Record the usage of the slot
-        slot_usage[available_slot].append((in_time, out_time))
-        # Add the data entry
-        data.append([vehicle_number, in_time.strftime('%m-%d-%Y %H:%M:%S'), out_time.strftime('%m-%d-%Y %H:%M:%S'),
-                     available_slot])
-# Write data to CSV file
-csv_filename = 'datasets/indian_vehicle_parking_data.csv'
-with open(csv_filename, mode='w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Vehicle Number', 'In Time', 'Out Time', 'Slot Number'])
-    writer.writerows(data)
-print(f"Dummy dataset for {num_days} days with different dates generated and saved to {csv_filename}.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
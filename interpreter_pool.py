@@ -0,0 +1,193 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+_interpreter_class = None
+
+
+def load_interpreter_class():
+    """
+    Imports the TensorFlow Lite Interpreter class on first use.
+
+    The lightweight tflite_runtime package is preferred when it is installed, since
+    importing full TensorFlow adds seconds to startup and hundreds of MB of memory.
+
+    Returns:
+    type: The Interpreter class to instantiate.
+    """
+    global _interpreter_class
+
+    if _interpreter_class is None:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite.python.interpreter import Interpreter
+        _interpreter_class = Interpreter
+    return _interpreter_class
+
+
+def set_interpreter_class(interpreter_class):
+    """
+    Makes pools created from now on use interpreter_class instead of the TensorFlow
+    Lite Interpreter, for example a stand-in model in the benchmarks.
+    """
+    global _interpreter_class
+
+    _interpreter_class = interpreter_class
+
+
+class PooledInterpreter:
+    """
+    A TensorFlow Lite interpreter owned by an InterpreterPool, together with the
+    batch dimension its input tensor is currently allocated for.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        self.interpreter = load_interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+        self.batch_size = 1
+        # Set to False once the model refuses a batch dimension other than 1
+        self.batch_supported = True
+        # preprocess.InputWriter for this interpreter, created by detect.py on first use
+        self.writer = None
+
+    def resize_input(self, batch_size):
+        """
+        Reallocates the input tensor for the given batch dimension if it is not already allocated for it.
+
+        Parameters:
+        batch_size (int): Number of frames in the next invoke().
+
+        Returns:
+        bool: True if the interpreter now accepts batch_size frames, False if the model only runs one frame at a time.
+        """
+        if batch_size == self.batch_size:
+            return True
+        if batch_size != 1 and not self.batch_supported:
+            return False
+
+        shape = list(self.input_details[0]['shape'])
+        index = self.input_details[0]['index']
+        try:
+            self.interpreter.resize_tensor_input(index, [batch_size] + shape[1:])
+            self.interpreter.allocate_tensors()
+        except (RuntimeError, ValueError):
+            # Detection post-processing ops in some exported models only support a batch of 1
+            self.disable_batching()
+            return batch_size == 1
+        self.batch_size = batch_size
+        return True
+
+    def disable_batching(self):
+        """
+        Reallocates the input tensor for one frame and stops resize_input() from trying bigger batches,
+        for models that accept a batched input but fail or return one frame's outputs on invoke().
+        """
+        self.batch_supported = False
+        shape = list(self.input_details[0]['shape'])
+        self.interpreter.resize_tensor_input(self.input_details[0]['index'], [1] + shape[1:])
+        self.interpreter.allocate_tensors()
+        self.batch_size = 1
+
+
+class InterpreterPool:
+    """
+    A bounded pool of pre-allocated interpreters for the same model.
+
+    Callers check an interpreter out with `with pool.checkout() as slot:` and it is
+    returned to the pool when the block exits, so concurrent Streamlit sessions never
+    share set_tensor()/invoke() on one interpreter. Time spent waiting for a free
+    interpreter is recorded and reported by stats().
+    """
+
+    def __init__(self, model_path, size=None, num_threads=None):
+        cpus = os.cpu_count() or 1
+        self.size = size or min(4, cpus)
+        self.num_threads = num_threads or max(1, cpus // self.size)
+        self.model_path = model_path
+
+        self._idle = queue.Queue(maxsize=self.size)
+        for _ in range(self.size):
+            self._idle.put(PooledInterpreter(model_path, num_threads=self.num_threads))
+
+        # All interpreters load the same model, so any of them describes the tensors
+        first = self._idle.queue[0]
+        self.input_details = first.input_details
+        self.output_details = first.output_details
+
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._waiting = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """
+        Borrows an interpreter from the pool for the duration of a with block.
+
+        Parameters:
+        timeout (float): Seconds to wait for a free interpreter, or None to wait indefinitely.
+
+        Raises:
+        queue.Empty: If no interpreter became free within timeout.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        try:
+            slot = self._idle.get(timeout=timeout)
+        finally:
+            waited = time.perf_counter() - start
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        try:
+            yield slot
+        finally:
+            self._idle.put(slot)
+
+    def warmup(self):
+        """
+        Runs one invoke() on a blank frame with every interpreter so the first real
+        request does not pay for kernel preparation.
+        """
+        slots = [self._idle.get() for _ in range(self.size)]
+        try:
+            for slot in slots:
+                slot.resize_input(1)
+                details = slot.input_details[0]
+                slot.interpreter.set_tensor(details['index'], np.zeros(details['shape'], dtype=details['dtype']))
+                slot.interpreter.invoke()
+        finally:
+            for slot in slots:
+                self._idle.put(slot)
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool's queue-wait metrics.
+
+        Returns:
+        dict: Pool size, threads per interpreter, interpreters in use, callers currently waiting,
+        total checkouts and the mean and max time spent waiting for an interpreter in milliseconds.
+        """
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                'size': self.size,
+                'num_threads': self.num_threads,
+                'in_use': self.size - self._idle.qsize(),
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'mean_wait_ms': (self._total_wait / checkouts * 1000) if checkouts else 0.0,
+                'max_wait_ms': self._max_wait * 1000,
+            }
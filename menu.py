@@ -8,4 +8,5 @@ def menu():
     st.sidebar.page_link("pages/register_vehicle.py", label="Register Vehicle")
     st.sidebar.page_link("pages/vehicle_log.py", label="Vehicle Log")
     st.sidebar.page_link("pages/vehicle_entry.py", label="Vehicle Entry")
-    st.sidebar.page_link("pages/parking_insights.py", label="Parking Insights")
\ No newline at end of file
+    st.sidebar.page_link("pages/parking_insights.py", label="Parking Insights")
+    st.sidebar.page_link("pages/diagnostics.py", label="Diagnostics")
\ No newline at end of file
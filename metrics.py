@@ -0,0 +1,239 @@
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Collection is off unless METRICS=1 or enable() is called. While off, timer() returns
+# a shared no-op context manager, so instrumented code pays one global lookup.
+enabled = os.environ.get('METRICS', '') not in ('', '0')
+# Port of the Prometheus text endpoint started by start_exporters(), if any
+metrics_port = int(os.environ.get('METRICS_PORT', 0)) or None
+# File rewritten with a JSON snapshot every json_interval seconds by start_exporters(), if any
+json_path = os.environ.get('METRICS_JSON') or None
+json_interval = float(os.environ.get('METRICS_JSON_INTERVAL', 10))
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_histograms = {}
+_registry_lock = threading.Lock()
+
+
+class Histogram:
+    """
+    Latency histogram of one stage with fixed buckets, plus the count, sum and max.
+    """
+
+    def __init__(self, name, buckets=BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        """
+        Estimates the q quantile in seconds by interpolating within its bucket.
+        """
+        with self._lock:
+            counts, count, largest = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else largest
+                return min(largest, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return largest
+
+    def snapshot(self):
+        with self._lock:
+            count, total, largest, counts = self.count, self.sum, self.max, list(self.counts)
+        return {
+            'count': count,
+            'total_s': total,
+            'mean_ms': total / count * 1000 if count else 0.0,
+            'p50_ms': self.quantile(0.5) * 1000,
+            'p90_ms': self.quantile(0.9) * 1000,
+            'p99_ms': self.quantile(0.99) * 1000,
+            'max_ms': largest * 1000,
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], counts)),
+        }
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def enable(flag=True):
+    global enabled
+
+    enabled = flag
+
+
+def histogram(name):
+    """
+    Returns the histogram of a stage, creating it on first use.
+    """
+    h = _histograms.get(name)
+    if h is None:
+        with _registry_lock:
+            h = _histograms.setdefault(name, Histogram(name))
+    return h
+
+
+def timer(name):
+    """
+    Times a with block into the histogram of the named stage, for example
+    `with metrics.timer('detect.invoke'):`. Does nothing while collection is off.
+    """
+    if not enabled:
+        return _null_timer
+    return _Timer(histogram(name))
+
+
+def observe(name, seconds):
+    """
+    Records a duration measured by the caller.
+    """
+    if enabled:
+        histogram(name).observe(seconds)
+
+
+def reset():
+    with _registry_lock:
+        _histograms.clear()
+
+
+def snapshot():
+    """
+    Returns the statistics of every stage, keyed by stage name.
+    """
+    with _registry_lock:
+        histograms = list(_histograms.values())
+    return {h.name: h.snapshot() for h in sorted(histograms, key=lambda h: h.name)}
+
+
+def prometheus_text():
+    """
+    Renders every histogram in the Prometheus text exposition format, as one
+    stage_duration_seconds metric labelled by stage.
+    """
+    lines = ['# HELP stage_duration_seconds Time spent in each processing stage.',
+             '# TYPE stage_duration_seconds histogram']
+    with _registry_lock:
+        histograms = sorted(_histograms.values(), key=lambda h: h.name)
+    for h in histograms:
+        with h._lock:
+            counts, count, total = list(h.counts), h.count, h.sum
+        label = h.name.replace('\\', '\\\\').replace('"', '\\"')
+        cumulative = 0
+        for bound, bucket_count in zip([repr(bound) for bound in h.buckets] + ['+Inf'], counts):
+            cumulative += bucket_count
+            lines.append(f'stage_duration_seconds_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'stage_duration_seconds_sum{{stage="{label}"}} {total}')
+        lines.append(f'stage_duration_seconds_count{{stage="{label}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = prometheus_text().encode(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(snapshot()).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='0.0.0.0'):
+    """
+    Serves /metrics (Prometheus text) and /metrics.json from a daemon thread.
+
+    Returns:
+    ThreadingHTTPServer: The server; call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def dump_json(path):
+    """
+    Writes a snapshot to path, replacing the file atomically.
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'time': time.time(), 'stages': snapshot()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def start_json_dump(path, interval):
+    """
+    Rewrites path with a snapshot every interval seconds from a daemon thread.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            dump_json(path)
+    threading.Thread(target=run, name='metrics-json', daemon=True).start()
+
+
+def start_exporters():
+    """
+    Enables collection and starts the exporters configured by METRICS_PORT and METRICS_JSON.
+    """
+    if metrics_port or json_path:
+        enable()
+    if metrics_port:
+        serve(metrics_port)
+    if json_path:
+        start_json_dump(json_path, json_interval)
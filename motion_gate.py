@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap change detector that decides whether a frame is worth running the plate detector on.
+
+    Each frame is cropped to the lane ROI, shrunk to scale_width pixels wide, converted
+    to grayscale and compared with a running-average background. The gate opens when
+    the fraction of changed pixels reaches on_threshold and closes only after it has
+    stayed below off_threshold for min_active_frames frames, so a car slowing down
+    at the barrier keeps being detected.
+    """
+
+    def __init__(self, roi=None, scale_width=160, pixel_threshold=25, on_threshold=0.02,
+                 off_threshold=0.005, min_active_frames=15, learning_rate=0.05):
+        """
+        Parameters:
+        roi (tuple): (x, y, w, h) lane region in frame pixels, or None for the whole frame.
+        scale_width (int): Width the ROI is shrunk to before differencing.
+        pixel_threshold (int): Grayscale difference above which a pixel counts as changed.
+        on_threshold (float): Fraction of changed pixels that opens the gate.
+        off_threshold (float): Fraction of changed pixels below which the gate may close.
+        min_active_frames (int): Quiet frames required before an open gate closes.
+        learning_rate (float): Weight of each new frame in the background average.
+        """
+        self.roi = roi
+        self.scale_width = scale_width
+        self.pixel_threshold = pixel_threshold
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.min_active_frames = min_active_frames
+        self.learning_rate = learning_rate
+
+        self.active = False
+        self.frames = 0
+        self.skipped = 0
+        self._background = None
+        self._quiet_frames = 0
+
+    def _prepare(self, frame):
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            frame = frame[y:y + h, x:x + w]
+        h, w = frame.shape[:2]
+        scale_height = max(1, h * self.scale_width // w)
+        small = cv2.resize(frame, (self.scale_width, scale_height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def update(self, frame):
+        """
+        Feeds the next frame to the gate.
+
+        Parameters:
+        frame (ndarray): Full BGR frame from the camera.
+
+        Returns:
+        bool: True if the detector should run on this frame.
+        """
+        gray = self._prepare(frame)
+        self.frames += 1
+
+        if self._background is None:
+            self._background = gray.astype(np.float32)
+            self.active = True
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        changed = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+        cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+
+        if changed >= self.on_threshold:
+            self.active = True
+            self._quiet_frames = 0
+        elif self.active and changed < self.off_threshold:
+            self._quiet_frames += 1
+            if self._quiet_frames >= self.min_active_frames:
+                self.active = False
+        else:
+            self._quiet_frames = 0
+
+        if not self.active:
+            self.skipped += 1
+        return self.active
+
+    def stats(self):
+        """
+        Returns the number of frames seen and skipped and the fraction of frames skipped.
+        """
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'skipped_fraction': self.skipped / self.frames if self.frames else 0.0,
+            'active': self.active,
+        }
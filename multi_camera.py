@@ -0,0 +1,514 @@
+"""
+Plate recognition for several gate cameras at once.
+
+Each gate in the JSON config has its own reader thread that decodes frames and runs
+the motion gate, a bounded frame queue, and a plate tracker. Detection and OCR run
+in a pool of worker processes, each with a single interpreter. Frames reach the
+workers through shared memory, so only the boxes and plate crops are pickled.
+
+The scheduler takes frames from the gates round-robin and lets each gate have at
+most per_gate_in_flight frames in the workers, so a busy gate cannot starve the
+others. No more than max_in_flight frames are in flight in total. When a gate
+falls behind, a live camera drops its oldest queued frames and a video file stops
+decoding until there is room.
+
+Every plate read is written to one CSV with the gate ID, direction and lot, and,
+unless record_occupancy is false in the config, recorded as an entry or exit
+event in the live occupancy state of occupancy_engine.py. Entering vehicles
+are then given a slot by slot_allocator.py, which leaving vehicles give back.
+
+Config:
+    {
+        "workers": 4,
+        "csv_path": "datasets/gate_sightings.csv",
+        "gates": [
+            {"gate_id": "main-in", "direction": "entry", "source": 0, "lot": "A"},
+            {"gate_id": "main-out", "direction": "exit", "source": "rtsp://10.0.0.12/stream", "roi": [0, 200, 640, 280]},
+            {"gate_id": "back", "direction": "entry", "source": "datasets/demo.mp4"}
+        ]
+    }
+
+Usage:
+    python multi_camera.py cameras.json [--workers 4]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import authorization
+import detect
+import metrics
+import ocr
+from motion_gate import MotionGate
+from occupancy_engine import OccupancyEngine, OccupancyEvent
+from ocr_cache import OcrCache
+from pipeline import BoundedQueue, STOP
+from plate_log import PlateLogWriter
+from plate_tracker import PlateTracker, vote
+from slot_allocator import SlotAllocator
+
+directions = ('entry', 'exit')
+csv_path = 'datasets/gate_sightings.csv'
+csv_header = ('NumberPlate', 'Timestamp', 'GateId', 'Direction', 'Lot')
+time_format = '%Y-%m-%d %H:%M:%S'
+
+# Frames queued per gate between its reader and the scheduler
+gate_queue_size = 4
+# Frames of one gate being processed by the workers at the same time
+per_gate_in_flight = 2
+# Seconds between throughput reports
+stats_interval = 10
+
+
+def is_live(source):
+    """
+    Returns True for camera indices and network streams, which keep producing frames
+    whether or not they are read, and False for video files.
+    """
+    return isinstance(source, int) or str(source).startswith(('rtsp://', 'rtmp://', 'http://', 'https://', 'udp://'))
+
+
+class Gate:
+    """
+    One camera and the scheduler-side state of its frames and plates.
+    """
+
+    def __init__(self, gate_id, source, direction='entry', lot=None, roi=None, live=None, queue_size=gate_queue_size):
+        """
+        Parameters:
+        gate_id (str): Name written with every plate read at this gate.
+        source (int | str): Camera index, stream URL or video file passed to cv2.VideoCapture.
+        direction (str): 'entry' or 'exit'.
+        lot (str): Parking lot the gate leads to, or None for the occupancy engine's default lot.
+        roi (list): (x, y, w, h) lane region watched for motion, or None for the whole frame.
+        live (bool): Whether to drop frames rather than wait when the gate falls behind; guessed from source if None.
+
+        Raises:
+        ValueError: If direction is not 'entry' or 'exit'.
+        """
+        if direction not in directions:
+            raise ValueError(f"direction of gate {gate_id!r} must be one of {directions}, not {direction!r}")
+        self.gate_id = gate_id
+        self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+        self.direction = direction
+        self.lot = lot
+        self.live = is_live(self.source) if live is None else live
+        self.frames = BoundedQueue(queue_size, drop_oldest=self.live)
+        self.motion_gate = MotionGate(roi=tuple(roi) if roi else None)
+        self.tracker = PlateTracker()
+
+        self.in_flight = 0
+        self.finished = False
+        # Frames get a sequence number when scheduled and reach the tracker in that order
+        self.next_seq = 0
+        self.next_result = 0
+        self.results = {}
+        # Capture time of the last frame each open track was seen on
+        self.track_times = {}
+
+        self.frames_read = 0
+        self.frames_detected = 0
+        self.plates = 0
+        self.errors = 0
+
+    def read(self, stop_event):
+        """
+        Reader thread: decodes frames and queues them, with None in place of frames the
+        motion gate skips so the tracker still counts them.
+        """
+        cap = cv2.VideoCapture(self.source)
+        try:
+            while not stop_event.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                self.frames_read += 1
+                captured_at = datetime.now()
+                moving = self.motion_gate.update(frame)
+                self.frames.put((frame if moving else None, captured_at))
+        finally:
+            cap.release()
+            self.frames.put(STOP)
+
+    def stats(self):
+        return {
+            'direction': self.direction,
+            'read': self.frames_read,
+            'skipped': self.motion_gate.skipped,
+            'dropped': self.frames.dropped,
+            'queued': len(self.frames),
+            'detected': self.frames_detected,
+            'plates': self.plates,
+            'errors': self.errors,
+        }
+
+
+def load_config(path):
+    """
+    Reads a JSON config.
+
+    Returns:
+    tuple: The list of Gate objects and the config dict.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    gates = [Gate(**gate) for gate in config['gates']]
+    if len({gate.gate_id for gate in gates}) != len(gates):
+        raise ValueError("gate_id must be unique")
+    return gates, config
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block again with the resource
+        # tracker, which spawned workers share with the runner that unlinks it
+        return shared_memory.SharedMemory(name=name)
+
+
+def run_task(task, engine, cache, blocks):
+    """
+    Runs one detect or OCR task in a worker.
+
+    Returns:
+    tuple: The result sent back to the runner, with None as the error.
+    """
+    if task[0] == 'detect':
+        _, slot, name, shape, gate_index, seq, captured_at = task
+        if slot not in blocks or blocks[slot].name != name:
+            if slot in blocks:
+                blocks[slot].close()
+            blocks[slot] = _attach(name)
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=blocks[slot].buf)
+        boxes, _, scores = detect.invoke([frame])
+        pixel_boxes = detect.extract_boxes(frame, boxes[0], scores[0])
+        crops = [frame[ymin:ymax, xmin:xmax].copy() for xmin, ymin, xmax, ymax in pixel_boxes]
+        return ('detect', slot, gate_index, seq, captured_at, pixel_boxes, crops, None)
+    _, gate_index, track_id, crops = task
+    texts = [ocr.read_plate_crop(crop, engine, cache, (gate_index, track_id)) for crop in crops]
+    return ('ocr', gate_index, track_id, texts, None)
+
+
+def failed_task(task, error):
+    """
+    Returns the result of a task that raised: no boxes or texts, and the error message.
+    """
+    message = f'{type(error).__name__}: {error}'
+    if task[0] == 'detect':
+        _, slot, _, _, gate_index, seq, captured_at = task
+        return ('detect', slot, gate_index, seq, captured_at, [], [], message)
+    _, gate_index, track_id, _ = task
+    return ('ocr', gate_index, track_id, [], message)
+
+
+def worker_main(tasks, results, num_threads):
+    """
+    Worker process: detects plates on frames in shared memory and reads plate crops,
+    with one interpreter using num_threads threads. A task that raises is answered with
+    an error result, so one bad frame neither kills the worker nor stalls its gate.
+    """
+    detect.pool_size = 1
+    detect.num_threads = num_threads
+    detect.warmup()
+    engine = detect.get_ocr_engine()
+    cache = OcrCache()
+    blocks = {}
+
+    for task in iter(tasks.get, None):
+        try:
+            result = run_task(task, engine, cache, blocks)
+        except Exception as error:
+            result = failed_task(task, error)
+        results.put(result)
+
+    for block in blocks.values():
+        block.close()
+
+
+class MultiCameraRunner:
+    """
+    Schedules the frames of several gates over a pool of detection workers.
+    """
+
+    def __init__(self, gates, workers=None, threads_per_worker=1, max_in_flight=None,
+                 per_gate_in_flight=per_gate_in_flight, csv_path=csv_path, record_occupancy=True):
+        """
+        Parameters:
+        gates (list): Gate objects to read.
+        workers (int): Worker processes, defaults to the number of CPUs divided by threads_per_worker.
+        threads_per_worker (int): Threads each worker's interpreter uses for invoke().
+        max_in_flight (int): Frames in the workers at once, defaults to two per worker.
+        per_gate_in_flight (int): Frames of one gate in the workers at once.
+        csv_path (str): CSV the plate reads are appended to.
+        record_occupancy (bool): Whether to record every read as an entry or exit in occupancy_engine.py
+            and assign entering vehicles a slot.
+        """
+        self.gates = gates
+        self.threads_per_worker = threads_per_worker
+        self.workers = workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.per_gate_in_flight = per_gate_in_flight
+        self.plate_log = PlateLogWriter(csv_path, header=csv_header)
+        self.occupancy = OccupancyEngine() if record_occupancy else None
+        self.slots = None
+        if self.occupancy is not None:
+            self.slots = SlotAllocator()
+            # Vehicles still parked from an earlier run keep their slots
+            for vehicle, (_, lot, slot_number) in self.occupancy.parked_vehicles().items():
+                if slot_number is not None:
+                    self.slots.claim(vehicle, lot, slot_number)
+
+        self.stop_event = threading.Event()
+        self.in_flight = 0
+        self._next_gate = 0
+        self._ocr_tasks = []
+        self._dispatched = {}
+        # One shared memory block per frame in flight, grown when a bigger frame comes along
+        self._blocks = [None] * self.max_in_flight
+        self._free_slots = list(range(self.max_in_flight))
+        self._processes = []
+        self._tasks = None
+        self._results = None
+
+    def run(self):
+        """
+        Processes every gate until all sources end or stop() is called, then writes the
+        plates of the tracks still open and shuts the workers down.
+        """
+        context = multiprocessing.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(target=worker_main, args=(self._tasks, self._results, self.threads_per_worker),
+                            name=f'detect-worker-{i}', daemon=True)
+            for i in range(self.workers)]
+        for process in self._processes:
+            process.start()
+        self.plate_log.start()
+        readers = [threading.Thread(target=gate.read, args=(self.stop_event,), name=f'gate-{gate.gate_id}', daemon=True)
+                   for gate in self.gates]
+        for reader in readers:
+            reader.start()
+
+        try:
+            flushed = False
+            last_report = time.perf_counter()
+            while True:
+                self._dispatch()
+                self._collect(timeout=0.005)
+                if all(gate.finished for gate in self.gates) and not self.in_flight and not self._ocr_tasks:
+                    if flushed:
+                        break
+                    # Sources ended: read the plates of the tracks still open
+                    for index, gate in enumerate(self.gates):
+                        self._queue_ocr(index, gate.tracker.flush())
+                    flushed = True
+                if time.perf_counter() - last_report >= stats_interval:
+                    self.check_workers()
+                    self.print_stats()
+                    last_report = time.perf_counter()
+        finally:
+            self.stop_event.set()
+            for _ in self._processes:
+                self._tasks.put(None)
+            for process in self._processes:
+                process.join()
+            for block in self._blocks:
+                if block is not None:
+                    block.close()
+                    block.unlink()
+            self.plate_log.close()
+            if self.occupancy is not None:
+                self.occupancy.close()
+        self.print_stats()
+
+    def stop(self):
+        """
+        Stops reading new frames; run() returns once the frames already read are processed.
+        """
+        self.stop_event.set()
+
+    def check_workers(self):
+        """
+        Raises:
+        RuntimeError: If a worker process died, since its tasks would never complete.
+        """
+        for process in self._processes:
+            if not process.is_alive():
+                raise RuntimeError(f"{process.name} exited with code {process.exitcode}")
+
+    def _dispatch(self):
+        # Plate crops of finished tracks go first; there are few and they complete a passage
+        while self._ocr_tasks and self.in_flight < self.max_in_flight:
+            self._tasks.put(('ocr',) + self._ocr_tasks.pop(0))
+            self.in_flight += 1
+
+        # Then one frame per gate per round, starting after the gate served last
+        progress = True
+        while progress:
+            progress = False
+            for _ in range(len(self.gates)):
+                index = self._next_gate
+                self._next_gate = (self._next_gate + 1) % len(self.gates)
+                gate = self.gates[index]
+                if gate.finished or gate.in_flight >= self.per_gate_in_flight:
+                    continue
+                if not self._free_slots:
+                    return
+                try:
+                    item = gate.frames.get(timeout=0)
+                except queue.Empty:
+                    continue
+                progress = True
+                if item is STOP:
+                    gate.finished = True
+                    continue
+
+                frame, captured_at = item
+                seq = gate.next_seq
+                gate.next_seq += 1
+                if frame is None:
+                    self._deliver(index, seq, captured_at, [], [])
+                else:
+                    self._send_frame(index, seq, frame, captured_at)
+
+    def _send_frame(self, gate_index, seq, frame, captured_at):
+        slot = self._free_slots.pop()
+        block = self._blocks[slot]
+        if block is None or block.size < frame.nbytes:
+            if block is not None:
+                block.close()
+                block.unlink()
+            block = self._blocks[slot] = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=block.buf)[...] = frame
+        self._tasks.put(('detect', slot, block.name, frame.shape, gate_index, seq, captured_at))
+        self._dispatched[slot] = time.perf_counter()
+        self.gates[gate_index].in_flight += 1
+        self.in_flight += 1
+
+    def _collect(self, timeout):
+        try:
+            result = self._results.get(timeout=timeout)
+        except queue.Empty:
+            # A worker that died takes its tasks with it; fail now rather than wait for them
+            if self.in_flight:
+                self.check_workers()
+            return
+        while True:
+            self.in_flight -= 1
+            error = result[-1]
+            if error is not None:
+                self.gates[result[2] if result[0] == 'detect' else result[1]].errors += 1
+                print(f"{result[0]} task failed: {error}")
+            if result[0] == 'detect':
+                _, slot, gate_index, seq, captured_at, pixel_boxes, crops, _ = result
+                metrics.observe('multi_camera.detect', time.perf_counter() - self._dispatched.pop(slot))
+                self._free_slots.append(slot)
+                gate = self.gates[gate_index]
+                gate.in_flight -= 1
+                gate.frames_detected += error is None
+                # A failed frame reaches the tracker without boxes, so the gate's later frames are not held back
+                self._deliver(gate_index, seq, captured_at, pixel_boxes, crops)
+            else:
+                _, gate_index, track_id, texts, _ = result
+                self._persist(gate_index, track_id, vote(texts))
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                return
+
+    def _deliver(self, gate_index, seq, captured_at, pixel_boxes, crops):
+        # Feed the gate's tracker its frames in capture order, whichever worker finished first
+        gate = self.gates[gate_index]
+        gate.results[seq] = (captured_at, pixel_boxes, crops)
+        while gate.next_result in gate.results:
+            captured_at, pixel_boxes, crops = gate.results.pop(gate.next_result)
+            gate.next_result += 1
+            track_ids, finished = gate.tracker.update(list(zip(pixel_boxes, crops)))
+            for track_id in track_ids:
+                gate.track_times[track_id] = captured_at
+            self._queue_ocr(gate_index, finished)
+
+    def _queue_ocr(self, gate_index, tracks):
+        for track in tracks:
+            self._ocr_tasks.append((gate_index, track.track_id, track.best_crops()))
+
+    def _persist(self, gate_index, track_id, text):
+        gate = self.gates[gate_index]
+        seen_at = gate.track_times.pop(track_id, None) or datetime.now()
+        if not text:
+            return
+        gate.plates += 1
+        self.plate_log.write([text, seen_at.strftime(time_format), gate.gate_id, gate.direction, gate.lot or ''])
+        if self.occupancy is not None:
+            self._record_occupancy(gate, text, seen_at.replace(microsecond=0))
+        access = "Access granted" if authorization.get_index().is_authorized(text) else "Access denied"
+        print(gate.gate_id, gate.direction, text, access)
+
+    def _record_occupancy(self, gate, text, seen_at):
+        # The slots follow the events the engine applies, so late or repeated reads change neither
+        if gate.direction == 'exit':
+            if self.occupancy.record(OccupancyEvent(text, 'exit', seen_at, lot=gate.lot, gate_id=gate.gate_id)):
+                self.slots.release(text)
+            return
+        held = self.slots.assignment(text)
+        assignment = held or self.slots.allocate(text, lot=gate.lot)
+        lot, slot_number = (assignment.lot, assignment.slot_number) if assignment else (gate.lot, None)
+        applied = self.occupancy.record(OccupancyEvent(text, 'entry', seen_at, lot=lot, slot_number=slot_number,
+                                                       gate_id=gate.gate_id))
+        if not applied and held is None and assignment is not None:
+            self.slots.release(text)
+
+    def print_stats(self):
+        for gate in self.gates:
+            stats = gate.stats()
+            print(f"{gate.gate_id} ({stats['direction']}): {stats['read']} read, {stats['skipped']} skipped, "
+                  f"{stats['dropped']} dropped, {stats['queued']} queued, {stats['detected']} detected, "
+                  f"{stats['plates']} plates, {stats['errors']} errors")
+        print('Plate log:', self.plate_log.stats())
+        if self.occupancy is not None:
+            print('Occupancy:', self.occupancy.lot_occupancy())
+            print('Slots:', self.slots.stats())
+        detection = metrics.snapshot().get('multi_camera.detect')
+        if detection:
+            print(f"Detection: {detection['count']} frames, p50 {detection['p50_ms']:.1f} ms, "
+                  f"p99 {detection['p99_ms']:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Read plates from several gate cameras.')
+    parser.add_argument('config', help='JSON file listing the gates')
+    parser.add_argument('--workers', type=int, help='detection worker processes')
+    parser.add_argument('--threads-per-worker', type=int, help='interpreter threads per worker')
+    parser.add_argument('--csv', help='CSV the plate reads are appended to')
+    args = parser.parse_args(argv)
+
+    gates, config = load_config(args.config)
+    runner = MultiCameraRunner(
+        gates,
+        workers=args.workers or config.get('workers'),
+        threads_per_worker=args.threads_per_worker or config.get('threads_per_worker', 1),
+        max_in_flight=config.get('max_in_flight'),
+        per_gate_in_flight=config.get('per_gate_in_flight', per_gate_in_flight),
+        csv_path=args.csv or config.get('csv_path', csv_path),
+        record_occupancy=config.get('record_occupancy', True))
+    metrics.enable()
+    metrics.start_exporters()
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        runner.print_stats()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+"""
+Live per-lot and per-slot occupancy, kept up to date from a stream of entry and
+exit events.
+
+Every event is appended to an event log before it is applied, and the state is
+written to a snapshot every snapshot_every events or snapshot_interval seconds,
+after which the log is emptied. A restarted engine loads the snapshot and replays
+only the events logged since, and readers in other processes (the Streamlit
+pages) follow the log the same way with refresh().
+
+Events may arrive late, out of order or more than once (two cameras on one gate,
+a resent batch). Each vehicle's state is decided by its newest event, so applying
+an event that is not newer than the last one seen for that vehicle changes nothing.
+Events more than max_lateness older than the newest event seen are dropped.
+Vehicles are keyed by their normalized plate, as in slot_allocator.py, so an
+exit read as 'MH 12 AB-1234' matches the entry read as 'MH12AB1234'.
+
+Usage:
+    python occupancy_engine.py ingest datasets/gate_sightings.csv   # feed a multi_camera.py sightings CSV
+    python occupancy_engine.py status
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import metrics
+from plates import normalize_plate
+
+state_dir = os.environ.get('OCCUPANCY_DIR', 'datasets/occupancy')
+lots_csv = 'datasets/parking_data.csv'
+time_format = '%Y-%m-%d %H:%M:%S'
+kinds = ('entry', 'exit')
+
+# Lot that vehicles entering without a lot are counted in
+default_lot = 'Visitor'
+# Events older than this behind the newest event seen are dropped as late
+max_lateness = timedelta(hours=1)
+snapshot_every = 1000
+snapshot_interval = 60.0
+
+# parking_data.csv holds one stringified list per lot, e.g. "['A', 50, datetime.datetime(2024, 7, 2, 19, 34, 1)]"
+_lot_pattern = re.compile(r"\[\s*'([^']+)'\s*,\s*(\d+)")
+
+
+def load_capacities(path=lots_csv):
+    """
+    Reads the number of slots of every lot from datasets/parking_data.csv.
+
+    Returns:
+    dict: Slots per lot name, or an empty dict if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return {lot: int(slots) for lot, slots in _lot_pattern.findall(f.read())}
+
+
+class OccupancyEvent(NamedTuple):
+    vehicle_number: str
+    kind: str
+    timestamp: datetime
+    lot: str = None
+    slot_number: int = None
+    gate_id: str = None
+
+    def to_json(self, seq):
+        return json.dumps([seq, self.vehicle_number, self.kind, self.timestamp.strftime(time_format),
+                           self.lot, self.slot_number, self.gate_id])
+
+    @classmethod
+    def from_json(cls, line):
+        seq, vehicle_number, kind, timestamp, lot, slot_number, gate_id = json.loads(line)
+        return seq, cls(vehicle_number, kind, datetime.strptime(timestamp, time_format), lot, slot_number, gate_id)
+
+
+class OccupancyEngine:
+    """
+    Occupancy counters updated in O(1) per event, with a write-ahead event log and snapshots.
+    """
+
+    def __init__(self, capacities=None, state_dir=state_dir, read_only=False, durability='flush',
+                 snapshot_every=snapshot_every, snapshot_interval=snapshot_interval):
+        """
+        Parameters:
+        capacities (dict): Slots per lot, defaults to load_capacities().
+        state_dir (str): Directory of the snapshot and the event log.
+        read_only (bool): Follow the state written by another process instead of recording events.
+        durability (str): 'none', 'flush' or 'fsync', applied to the event log after each event.
+        snapshot_every (int): Events between snapshots.
+        snapshot_interval (float): Seconds between snapshots.
+        """
+        self.capacities = load_capacities() if capacities is None else dict(capacities)
+        self.state_dir = state_dir
+        self.read_only = read_only
+        self.durability = durability
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_path = os.path.join(state_dir, 'snapshot.json')
+        self.log_path = os.path.join(state_dir, 'events.log')
+
+        self._lock = threading.RLock()
+        self._log = None
+        self._log_position = 0
+        self._reset()
+        self.recover()
+
+    def _reset(self):
+        self.seq = 0
+        self.occupied = {lot: 0 for lot in self.capacities}
+        # vehicle -> [entered at, lot, slot] for every vehicle parked now
+        self.parked = {}
+        # slot -> vehicle parked in it
+        self.slots = {}
+        # vehicle -> [time, kind] of its newest event
+        self.last_event = {}
+        self.high_watermark = None
+        self.counters = {'applied': 0, 'duplicate': 0, 'stale': 0, 'late': 0, 'unmatched_exit': 0,
+                         'missed_exit': 0, 'slot_conflict': 0}
+        self._snapshot_seq = 0
+        self._snapshot_time = time.monotonic()
+
+    def record(self, event):
+        """
+        Logs an event and applies it.
+
+        Returns:
+        bool: True if the event changed the occupancy.
+
+        Raises:
+        ValueError: If event.kind is not 'entry' or 'exit'.
+        """
+        if self.read_only:
+            raise ValueError("read-only OccupancyEngine cannot record events")
+        if event.kind not in kinds:
+            raise ValueError(f"event kind must be one of {kinds}, not {event.kind!r}")
+        event = event._replace(vehicle_number=normalize_plate(event.vehicle_number))
+        with metrics.timer('occupancy.record'), self._lock:
+            self.seq += 1
+            self._append(event.to_json(self.seq))
+            applied = self.apply(event)
+            if (self.seq - self._snapshot_seq >= self.snapshot_every
+                    or time.monotonic() - self._snapshot_time >= self.snapshot_interval):
+                self.snapshot()
+            return applied
+
+    def apply(self, event):
+        """
+        Applies an event to the counters without logging it.
+
+        Returns:
+        bool: True if the event changed the occupancy.
+        """
+        with self._lock:
+            vehicle = normalize_plate(event.vehicle_number)
+            if self.high_watermark is not None and event.timestamp < self.high_watermark - max_lateness:
+                self.counters['late'] += 1
+                return False
+            if self.high_watermark is None or event.timestamp > self.high_watermark:
+                self.high_watermark = event.timestamp
+
+            last = self.last_event.get(vehicle)
+            if last is not None and event.timestamp <= last[0]:
+                self.counters['duplicate' if (event.timestamp, event.kind) == tuple(last) else 'stale'] += 1
+                return False
+            self.last_event[vehicle] = [event.timestamp, event.kind]
+            self.counters['applied'] += 1
+
+            if event.kind == 'entry':
+                if vehicle in self.parked:
+                    # The exit was never seen; move the vehicle to where it entered now
+                    self.counters['missed_exit'] += 1
+                    self._leave(vehicle)
+                lot = event.lot or default_lot
+                slot = event.slot_number
+                if slot is not None and slot in self.slots:
+                    self.counters['slot_conflict'] += 1
+                    self.parked[self.slots[slot]][2] = None
+                self.parked[vehicle] = [event.timestamp, lot, slot]
+                self.occupied[lot] = self.occupied.get(lot, 0) + 1
+                if slot is not None:
+                    self.slots[slot] = vehicle
+                return True
+
+            if vehicle not in self.parked:
+                self.counters['unmatched_exit'] += 1
+                return False
+            self._leave(vehicle)
+            return True
+
+    def _leave(self, vehicle):
+        _, lot, slot = self.parked.pop(vehicle)
+        self.occupied[lot] -= 1
+        if slot is not None and self.slots.get(slot) == vehicle:
+            del self.slots[slot]
+
+    def lot_occupancy(self):
+        """
+        Returns the occupied, free and total slots of every lot.
+
+        Returns:
+        dict: Lot name -> {'occupied', 'capacity', 'free'}, with capacity None for lots without a known size.
+        """
+        with self._lock:
+            return {lot: {'occupied': occupied,
+                          'capacity': self.capacities.get(lot),
+                          'free': self.capacities[lot] - occupied if lot in self.capacities else None}
+                    for lot, occupied in self.occupied.items()}
+
+    def vehicle_in_slot(self, slot_number):
+        with self._lock:
+            return self.slots.get(slot_number)
+
+    def parked_vehicles(self):
+        """
+        Returns a copy of vehicle -> (entered at, lot, slot) for every vehicle parked now.
+        """
+        with self._lock:
+            return {vehicle: tuple(state) for vehicle, state in self.parked.items()}
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, seq=self.seq, parked=len(self.parked), snapshot_seq=self._snapshot_seq)
+
+    def _append(self, line):
+        if self._log is None:
+            os.makedirs(self.state_dir, exist_ok=True)
+            self._log = open(self.log_path, 'a')
+        self._log.write(line + '\n')
+        if self.durability != 'none':
+            self._log.flush()
+        if self.durability == 'fsync':
+            os.fsync(self._log.fileno())
+
+    def snapshot(self):
+        """
+        Writes the state to the snapshot file atomically, then empties the event log.
+        """
+        with self._lock:
+            # Vehicles that left before the lateness window cannot be affected by any further event
+            if self.high_watermark is not None:
+                horizon = self.high_watermark - max_lateness
+                self.last_event = {vehicle: last for vehicle, last in self.last_event.items()
+                                   if last[0] >= horizon or vehicle in self.parked}
+            state = {
+                'seq': self.seq,
+                'capacities': self.capacities,
+                'occupied': self.occupied,
+                'parked': {vehicle: [entered_at.strftime(time_format), lot, slot]
+                           for vehicle, (entered_at, lot, slot) in self.parked.items()},
+                'last_event': {vehicle: [at.strftime(time_format), kind]
+                               for vehicle, (at, kind) in self.last_event.items()},
+                'high_watermark': self.high_watermark.strftime(time_format) if self.high_watermark else None,
+                'counters': self.counters,
+            }
+            os.makedirs(self.state_dir, exist_ok=True)
+            tmp_path = f'{self.snapshot_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+                f.flush()
+                if self.durability == 'fsync':
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # Events up to seq are in the snapshot; replay skips them if the log outlives it
+            if self._log is not None:
+                self._log.truncate(0)
+                self._log.seek(0)
+            self._snapshot_seq = self.seq
+            self._snapshot_time = time.monotonic()
+
+    def recover(self):
+        """
+        Loads the snapshot, if any, and replays the events logged after it.
+        """
+        with self._lock:
+            self._reset()
+            self._log_position = 0
+            self._loaded_snapshot = self._snapshot_id()
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path) as f:
+                    state = json.load(f)
+                self.seq = self._snapshot_seq = state['seq']
+                self.capacities = {**state['capacities'], **self.capacities}
+                self.occupied.update(state['occupied'])
+                self.parked = {vehicle: [datetime.strptime(entered_at, time_format), lot, slot]
+                               for vehicle, (entered_at, lot, slot) in state['parked'].items()}
+                self.slots = {slot: vehicle for vehicle, (_, _, slot) in self.parked.items() if slot is not None}
+                self.last_event = {vehicle: [datetime.strptime(at, time_format), kind]
+                                   for vehicle, (at, kind) in state['last_event'].items()}
+                if state['high_watermark']:
+                    self.high_watermark = datetime.strptime(state['high_watermark'], time_format)
+                self.counters.update(state['counters'])
+            self._replay()
+            if not self.read_only and self.seq > self._snapshot_seq:
+                self.snapshot()
+
+    def _replay(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path) as f:
+            f.seek(self._log_position)
+            for line in f:
+                if not line.endswith('\n'):
+                    # Partly written by the recording process; read it on the next refresh
+                    break
+                self._log_position += len(line)
+                seq, event = OccupancyEvent.from_json(line)
+                if seq > self.seq:
+                    self.seq = seq
+                    self.apply(event)
+
+    def _snapshot_id(self):
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def refresh(self):
+        """
+        Catches a read-only engine up with the recording process: replays new log lines,
+        or reloads the snapshot if a snapshot was taken, and the log emptied, since the last call.
+        """
+        with self._lock:
+            if self._snapshot_id() != self._loaded_snapshot:
+                self.recover()
+                return
+            try:
+                self._replay()
+            except ValueError:
+                # The log was emptied and rewritten while it was being read
+                self.recover()
+                return
+            if self._snapshot_id() != self._loaded_snapshot:
+                self.recover()
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self.snapshot()
+                self._log.close()
+                self._log = None
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Returns a process-wide read-only engine following the state in state_dir, caught up with the newest events.
+    """
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            _engine = OccupancyEngine(read_only=True)
+        else:
+            _engine.refresh()
+        return _engine
+
+
+def events_from_sightings(path):
+    """
+    Yields entry and exit events from a sightings CSV written by multi_camera.py.
+    """
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield OccupancyEvent(row['NumberPlate'], row['Direction'],
+                                 datetime.strptime(row['Timestamp'], time_format),
+                                 lot=row.get('Lot') or None, gate_id=row['GateId'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Live parking occupancy from entry and exit events.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ingest = subparsers.add_parser('ingest', help='record the events of a multi_camera.py sightings CSV')
+    ingest.add_argument('sightings')
+    subparsers.add_parser('status', help='print the occupancy of every lot')
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        engine = OccupancyEngine()
+        start = time.perf_counter()
+        count = 0
+        for event in events_from_sightings(args.sightings):
+            engine.record(event)
+            count += 1
+        engine.close()
+        print(f"Recorded {count} events in {time.perf_counter() - start:.2f}s: {engine.stats()}")
+    else:
+        start = time.perf_counter()
+        engine = OccupancyEngine(read_only=True)
+        print(f"Recovered seq {engine.seq} in {(time.perf_counter() - start) * 1000:.1f} ms: {engine.stats()}")
+    for lot, counts in engine.lot_occupancy().items():
+        print(f"{lot}: {counts['occupied']} occupied of {counts['capacity'] if counts['capacity'] is not None else '?'}")
+
+
+if __name__ == '__main__':
+    main()
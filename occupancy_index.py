@@ -0,0 +1,222 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# End time used for sessions that have no Out Time yet
+_open_end = np.iinfo(np.int64).max
+# Sessions appended since the last full build are merged into it once they outnumber
+# this share of it, or compact_min_sessions, whichever is larger
+compact_ratio = 0.1
+compact_min_sessions = 10_000
+
+
+def _to_ns(moment):
+    return pd.Timestamp(moment).value
+
+
+def _column_ns(column):
+    return pd.to_datetime(column).to_numpy('datetime64[ns]').view('i8')
+
+
+class OccupancyIndex:
+    """
+    Interval index over parking sessions for point-in-time and time-range occupancy.
+
+    Session start and end times are kept as sorted int64 arrays, so the number of
+    sessions in progress at an instant or overlapping a range is two searchsorted()
+    calls. For per-slot occupancy the sessions are also sorted by (slot, start) under
+    a single composite key, which finds the latest session of every slot started
+    before an instant with one vectorized searchsorted().
+
+    A session is in progress at t when In Time <= t <= Out Time. Sessions without an
+    Out Time are treated as still parked.
+    """
+
+    def __init__(self, sessions):
+        sessions = sessions[sessions['In Time'].notna()].reset_index(drop=True)
+        self.sessions = sessions
+
+        starts = _column_ns(sessions['In Time'])
+        ends = _column_ns(sessions['Out Time'])
+        is_open = sessions['Out Time'].isna().to_numpy()
+        ends = np.where(is_open, _open_end, ends)
+        self._session_starts = starts
+        self._session_ends = ends
+
+        # Global sorted arrays for counts
+        self._by_start = np.argsort(starts, kind='stable')
+        self._starts = starts[self._by_start]
+        self._ends = np.sort(ends)
+
+        # Sessions starting before t - max_duration cannot be in progress at t
+        closed = ends[~is_open] - starts[~is_open]
+        self._max_duration = int(closed.max()) if len(closed) else 0
+        self._open_ids = np.flatnonzero(is_open)
+
+        # Per-slot arrays, ordered by slot then start, with key slot_code * n + start rank
+        n = len(sessions)
+        codes, self.slots = pd.factorize(sessions['Slot Number'], sort=True)
+        rank = np.empty(n, dtype=np.int64)
+        rank[self._by_start] = np.arange(n)
+        has_slot = np.flatnonzero(codes >= 0)
+        order = has_slot[np.lexsort((rank[has_slot], codes[has_slot]))]
+        self._slot_ids = order
+        self._slot_codes = codes[order].astype(np.int64)
+        self._slot_keys = self._slot_codes * n + rank[order]
+        self._slot_ends = ends[order]
+        # Latest end among the sessions of the slot up to each position, to tell when
+        # an earlier, overlapping session of the slot may still be in progress
+        self._slot_max_ends = pd.Series(self._slot_ends).groupby(self._slot_codes).cummax().to_numpy()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def count_at(self, moment):
+        """
+        Returns the number of sessions in progress at moment.
+        """
+        return int(self.counts_at([moment])[0])
+
+    def counts_at(self, moments):
+        """
+        Returns the number of sessions in progress at each of moments, as an array.
+        """
+        t = _column_ns(pd.Series(moments))
+        return np.searchsorted(self._starts, t, side='right') - np.searchsorted(self._ends, t, side='left')
+
+    def count_between(self, start, end):
+        """
+        Returns the number of sessions in progress at any time between start and end.
+        """
+        # Every session ending before start also started before end, so the two counts nest
+        return int(np.searchsorted(self._starts, _to_ns(end), side='right')
+                   - np.searchsorted(self._ends, _to_ns(start), side='left'))
+
+    def sessions_between(self, start, end):
+        """
+        Returns the sessions in progress at any time between start and end, oldest first.
+        """
+        start, end = _to_ns(start), _to_ns(end)
+        lo = np.searchsorted(self._starts, start - self._max_duration, side='left')
+        hi = np.searchsorted(self._starts, end, side='right')
+        ids = self._by_start[lo:hi]
+        open_ids = self._open_ids[self._session_starts[self._open_ids] <= end]
+        ids = np.union1d(ids[self._session_ends[ids] >= start], open_ids)
+        return self.sessions.iloc[ids].sort_values('In Time', kind='stable')
+
+    def occupied_at(self, moment):
+        """
+        Returns the latest session in progress at moment for every occupied slot, oldest first.
+        """
+        t = _to_ns(moment)
+        n = len(self.sessions)
+        started = np.searchsorted(self._starts, t, side='right')
+        codes = np.arange(len(self.slots), dtype=np.int64)
+        positions = np.searchsorted(self._slot_keys, codes * n + started, side='left') - 1
+
+        ids = []
+        for code, position in zip(codes.tolist(), positions.tolist()):
+            # Walk back over sessions of the slot that ended before t; with
+            # non-overlapping sessions the first one checked is the answer
+            while position >= 0 and self._slot_codes[position] == code and self._slot_max_ends[position] >= t:
+                if self._slot_ends[position] >= t:
+                    ids.append(self._slot_ids[position])
+                    break
+                position -= 1
+        return self.sessions.iloc[ids].sort_values('In Time', kind='stable')
+
+    def timeline(self, start, end, freq='15min'):
+        """
+        Returns the number of sessions in progress at every freq step from start to end,
+        as a Series indexed by time.
+        """
+        moments = pd.date_range(start, end, freq=freq)
+        return pd.Series(self.counts_at(moments), index=moments, name='Occupied')
+
+
+class LayeredOccupancyIndex:
+    """
+    An OccupancyIndex over most sessions plus a small one over the sessions appended
+    since, answering the same queries as one index over both.
+
+    extend() rebuilds only the small index, and merges the two once the appended
+    sessions outnumber compact_ratio of the large one, so appending costs time in
+    proportion to the recent sessions rather than to the whole table. Indexes are never
+    modified, so queries running in other sessions keep a consistent view.
+    """
+
+    def __init__(self, base, delta=None):
+        self.base = base
+        self.delta = delta
+
+    def extend(self, sessions):
+        """
+        Returns a new index that also covers sessions.
+        """
+        if self.delta is not None:
+            sessions = pd.concat([self.delta.sessions, sessions], ignore_index=True)
+        if len(sessions) > max(compact_min_sessions, compact_ratio * len(self.base)):
+            return LayeredOccupancyIndex(OccupancyIndex(pd.concat([self.base.sessions, sessions], ignore_index=True)))
+        return LayeredOccupancyIndex(self.base, OccupancyIndex(sessions))
+
+    @property
+    def sessions(self):
+        if self.delta is None:
+            return self.base.sessions
+        return pd.concat([self.base.sessions, self.delta.sessions], ignore_index=True)
+
+    def _layers(self):
+        return (self.base,) if self.delta is None else (self.base, self.delta)
+
+    def __len__(self):
+        return sum(len(layer) for layer in self._layers())
+
+    def count_at(self, moment):
+        return int(self.counts_at([moment])[0])
+
+    def counts_at(self, moments):
+        # Each session is in exactly one layer, so the counts add up
+        return sum(layer.counts_at(moments) for layer in self._layers())
+
+    def count_between(self, start, end):
+        return sum(layer.count_between(start, end) for layer in self._layers())
+
+    def sessions_between(self, start, end):
+        if self.delta is None:
+            return self.base.sessions_between(start, end)
+        sessions = pd.concat([layer.sessions_between(start, end) for layer in self._layers()])
+        return sessions.sort_values('In Time', kind='stable')
+
+    def occupied_at(self, moment):
+        if self.delta is None:
+            return self.base.occupied_at(moment)
+        # Keep the latest session in progress of every slot across both layers
+        sessions = pd.concat([layer.occupied_at(moment) for layer in self._layers()]).sort_values('In Time', kind='stable')
+        return sessions.drop_duplicates('Slot Number', keep='last')
+
+    timeline = OccupancyIndex.timeline
+
+
+_index = None
+_version = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Returns the process-wide occupancy index over the parking database. Sessions added
+    since the last call are read by id and appended; a re-import rebuilds the index.
+    """
+    global _index, _version
+
+    version = storage.sessions_version()
+    with _index_lock:
+        if _index is None or version[0] != _version[0] or version[1] < _version[1]:
+            _index = LayeredOccupancyIndex(OccupancyIndex(storage.all_sessions()))
+        elif version[1] != _version[1]:
+            _index = _index.extend(storage.sessions_added(_version[1], version[1]))
+        _version = version
+        return _index
@@ -0,0 +1,261 @@
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import metrics
+from ocr_cache import dhash
+
+PLATE_WHITELIST = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Path to the tesseract executable, used by the subprocess based backends
+tesseract_cmd = os.environ.get('TESSERACT_CMD', r'C:\Program Files\Tesseract-OCR\\tesseract.exe')
+# Backend picked by get_engine() when none is requested: 'tesserocr', 'tesseract-batch' or 'pytesseract'
+default_backend = os.environ.get('OCR_BACKEND')
+# Number of ROIs recognised concurrently by one engine
+default_workers = int(os.environ.get('OCR_WORKERS', 0)) or min(4, os.cpu_count() or 1)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def tesseract_config(psm=None, oem=None, whitelist=None):
+    """
+    Builds the command line config string understood by pytesseract and the tesseract CLI.
+    """
+    parts = []
+    if whitelist:
+        parts.append(f'-c tessedit_char_whitelist={whitelist}')
+    if psm is not None:
+        parts.append(f'--psm {psm}')
+    if oem is not None:
+        parts.append(f'--oem {oem}')
+    return ' '.join(parts)
+
+
+class OcrEngine:
+    """
+    Base class for OCR backends. Engines are long-lived and configured once with the
+    page segmentation mode, engine mode and character whitelist.
+    """
+
+    name = None
+
+    def __init__(self, psm=None, oem=None, whitelist=None, workers=None):
+        self.psm = psm
+        self.oem = oem
+        self.whitelist = whitelist
+        self.workers = workers or default_workers
+
+    def recognize(self, roi):
+        """
+        Reads the text in one image region.
+
+        Parameters:
+        roi (ndarray): Grayscale or BGR image array.
+
+        Returns:
+        str: The recognised text.
+        """
+        raise NotImplementedError
+
+    def recognize_batch(self, rois):
+        """
+        Reads the text in several image regions.
+
+        Parameters:
+        rois (list): Grayscale or BGR image arrays.
+
+        Returns:
+        list: The recognised text for each region, in order.
+        """
+        if len(rois) <= 1 or self.workers == 1:
+            return [self.recognize(roi) for roi in rois]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(rois))) as executor:
+            return list(executor.map(self.recognize, rois))
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine(OcrEngine):
+    """
+    In-process OCR through the tesserocr bindings to the Tesseract C++ API.
+
+    Each worker keeps one TessBaseAPI with the language data loaded, so recognising a
+    ROI costs neither a process fork, a temp file nor reloading the model. tesserocr
+    releases the GIL while recognising, so workers run in parallel on threads.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self, psm=None, oem=None, whitelist=None, workers=None):
+        super().__init__(psm, oem, whitelist, workers)
+        import tesserocr
+
+        kwargs = {}
+        if psm is not None:
+            kwargs['psm'] = psm
+        if oem is not None:
+            kwargs['oem'] = oem
+        self._apis = queue.Queue()
+        for _ in range(self.workers):
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            if whitelist:
+                api.SetVariable('tessedit_char_whitelist', whitelist)
+            self._apis.put(api)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def recognize(self, roi):
+        roi = np.ascontiguousarray(roi)
+        height, width = roi.shape[:2]
+        channels = 1 if roi.ndim == 2 else roi.shape[2]
+        api = self._apis.get()
+        try:
+            api.SetImageBytes(roi.tobytes(), width, height, channels, width * channels)
+            return api.GetUTF8Text()
+        finally:
+            self._apis.put(api)
+
+    def recognize_batch(self, rois):
+        if len(rois) <= 1:
+            return [self.recognize(roi) for roi in rois]
+        return list(self._executor.map(self.recognize, rois))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        while not self._apis.empty():
+            self._apis.get().End()
+
+
+class TesseractBatchEngine(OcrEngine):
+    """
+    Runs one tesseract process per batch instead of one per ROI.
+
+    The ROIs are written to a temp directory and passed to tesseract as an image list,
+    so the language data is loaded once per batch. Pages in the output are separated
+    by form feeds, which are used to split the text back per ROI.
+    """
+
+    name = 'tesseract-batch'
+
+    def recognize(self, roi):
+        return self.recognize_batch([roi])[0]
+
+    def recognize_batch(self, rois):
+        if not rois:
+            return []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for i, roi in enumerate(rois):
+                path = os.path.join(tmpdir, f'{i}.png')
+                cv2.imwrite(path, roi)
+                paths.append(path)
+            list_path = os.path.join(tmpdir, 'rois.txt')
+            with open(list_path, 'w') as f:
+                f.write('\n'.join(paths) + '\n')
+
+            command = [tesseract_cmd, list_path, 'stdout'] + tesseract_config(self.psm, self.oem).split()
+            if self.whitelist:
+                command += ['-c', f'tessedit_char_whitelist={self.whitelist}']
+            output = subprocess.run(command, capture_output=True, check=True).stdout.decode('utf-8', 'replace')
+
+        texts = output.split('\f')
+        # tesseract terminates every page, including the last, with a form feed
+        texts = texts[:len(rois)] + [''] * (len(rois) - len(texts))
+        return texts
+
+
+class PytesseractEngine(OcrEngine):
+    """
+    The original path: one pytesseract.image_to_string() subprocess per ROI.
+    """
+
+    name = 'pytesseract'
+
+    def __init__(self, psm=None, oem=None, whitelist=None, workers=None):
+        super().__init__(psm, oem, whitelist, workers)
+        import pytesseract
+
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        self._pytesseract = pytesseract
+        self._config = tesseract_config(psm, oem, whitelist)
+
+    def recognize(self, roi):
+        return self._pytesseract.image_to_string(roi, config=self._config)
+
+
+backends = {
+    TesserocrEngine.name: TesserocrEngine,
+    TesseractBatchEngine.name: TesseractBatchEngine,
+    PytesseractEngine.name: PytesseractEngine,
+}
+
+
+def get_engine(psm=None, oem=None, whitelist=None, backend=None):
+    """
+    Returns the shared engine for the given configuration, creating it on first use.
+
+    When no backend is requested, OCR_BACKEND is used if set, otherwise the persistent
+    tesserocr engine is preferred and pytesseract is the fallback.
+
+    Parameters:
+    psm (int): Tesseract page segmentation mode.
+    oem (int): Tesseract OCR engine mode.
+    whitelist (str): Characters tesseract is allowed to output.
+    backend (str): One of the keys of backends.
+
+    Returns:
+    OcrEngine: The engine.
+    """
+    backend = backend or default_backend
+    key = (backend, psm, oem, whitelist)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            if backend:
+                engine = backends[backend](psm, oem, whitelist)
+            else:
+                try:
+                    engine = TesserocrEngine(psm, oem, whitelist)
+                except ImportError:
+                    engine = PytesseractEngine(psm, oem, whitelist)
+            _engines[key] = engine
+    return engine
+
+
+def read_plate_crop(crop, engine, cache=None, scope=None):
+    """
+    Reads the text of one plate crop the way every gate runner does: grayscale, bilateral
+    filter, OCR, then stray brackets and commas removed.
+
+    Parameters:
+    crop (ndarray): Plate crop in BGR format (OpenCV).
+    engine (OcrEngine): Engine that reads the filtered crop.
+    cache (OcrCache): Optional cache of results for near-identical crops.
+    scope: Cache scope of the crop, such as its track, so other plates never hit its entries.
+
+    Returns:
+    str: The plate text.
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    crop_hash = None
+    if cache is not None:
+        crop_hash = dhash(gray)
+        text = cache.get(crop_hash, scope)
+        if text is not None:
+            return text
+
+    with metrics.timer('ocr.filter'):
+        gray = cv2.bilateralFilter(gray, 10, 20, 20)
+    with metrics.timer('ocr.recognize'):
+        text = engine.recognize(gray).strip()
+    text = text.replace('(', '').replace(')', '').replace(',', '').replace(']', '')
+    if cache is not None:
+        cache.put(crop_hash, text, scope)
+    return text
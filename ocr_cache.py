@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def dhash(gray, hash_size=8):
+    """
+    Computes a difference hash of a grayscale image.
+
+    The image is shrunk to (hash_size + 1) x hash_size and each bit records whether a
+    pixel is brighter than its right neighbour, so crops of the same plate a few frames
+    apart hash to values only a few bits apart.
+
+    Parameters:
+    gray (ndarray): Grayscale image array.
+    hash_size (int): Bits per row and number of rows of the hash.
+
+    Returns:
+    int: A hash_size * hash_size bit integer.
+    """
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class OcrCache:
+    """
+    LRU cache of OCR results keyed by the perceptual hash of the crop within a scope,
+    such as the track the crop belongs to.
+
+    A lookup hits when a cached hash of the same scope is within max_distance bits of
+    the query, so near-identical crops of one plate are recognised once. A 64-bit
+    dHash does not tell different plates apart reliably, so lookups never match
+    entries of another scope: a following car cannot get the previous car's text.
+    Entries expire ttl seconds after they were last hit, and the least recently used
+    entry is evicted once maxsize entries are cached.
+    """
+
+    def __init__(self, maxsize=256, ttl=5.0, max_distance=4):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, scope=None):
+        """
+        Returns the cached text for the nearest hash of scope within max_distance of key, or None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            match = (scope, key) if (scope, key) in self._entries else None
+            if match is None:
+                best = self.max_distance + 1
+                for cached in self._entries:
+                    if cached[0] != scope:
+                        continue
+                    distance = (cached[1] ^ key).bit_count()
+                    if distance < best:
+                        match, best = cached, distance
+            if match is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            text, _ = self._entries[match]
+            self._entries[match] = (text, now)
+            self._entries.move_to_end(match)
+            return text
+
+    def put(self, key, text, scope=None):
+        with self._lock:
+            self._entries[scope, key] = (text, time.monotonic())
+            self._entries.move_to_end((scope, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _expire(self, now):
+        # Entries are kept in last-used order, so expired ones are at the front
+        while self._entries:
+            key, (_, used) = next(iter(self._entries.items()))
+            if now - used <= self.ttl:
+                break
+            del self._entries[key]
+
+    def stats(self):
+        """
+        Returns hit and miss counters and the current number of cached crops.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries),
+            }
@@ -0,0 +1,66 @@
+import streamlit as st
+import pandas as pd
+import detect
+import detect_client
+import metrics
+from utils import display_heading
+from menu import menu
+
+
+def main():
+    with open("style.css") as css:
+        st.markdown(f'<style>{css.read()}</style>', unsafe_allow_html=True)
+
+    menu()
+    display_heading()
+
+    st.title("Diagnostics")
+    st.markdown("Per-stage timings of the detection path in this app process.")
+
+    # Collection is process-wide, so turning it on here also times detections made on other pages
+    collect = st.toggle("Collect stage timings", value=metrics.enabled, key="collect_metrics")
+    if collect != metrics.enabled:
+        metrics.enable(collect)
+
+    if st.button("Reset timings", key="reset_metrics"):
+        metrics.reset()
+
+    stages = metrics.snapshot()
+    if stages:
+        table = pd.DataFrame.from_dict(stages, orient='index').drop(columns='buckets')
+        table.index.name = 'Stage'
+        table = table.rename(columns={'count': 'Calls', 'total_s': 'Total (s)', 'mean_ms': 'Mean (ms)',
+                                      'p50_ms': 'p50 (ms)', 'p90_ms': 'p90 (ms)', 'p99_ms': 'p99 (ms)',
+                                      'max_ms': 'Max (ms)'})
+        st.subheader("Stage Latency")
+        st.dataframe(table.style.format(precision=2))
+        st.subheader("Total Time per Stage")
+        st.bar_chart(table['Total (s)'])
+        with st.expander("Prometheus metrics"):
+            st.code(metrics.prometheus_text(), language=None)
+    elif collect:
+        st.info("No timings recorded yet. Run a detection on the Register Vehicle or Vehicle Entry page.")
+    else:
+        st.info("Stage timings are off. Turn them on above, or start the app with METRICS=1.")
+
+    if detect.pool is not None:
+        st.subheader("Interpreter Pool")
+        st.table(pd.DataFrame([detect.pool.stats()]))
+
+    client = detect_client.get_client()
+    if client is not None:
+        st.subheader("Detection Server")
+        try:
+            stats = client.stats()
+        except (OSError, RuntimeError) as error:
+            st.error(f"Detection server at {detect_client.server_url} is unreachable: {error}")
+        else:
+            batch_sizes = stats.pop('batch_sizes')
+            st.table(pd.DataFrame([{key: value for key, value in stats.items() if key != 'pool'}]))
+            if batch_sizes:
+                st.markdown("Batches by number of frames")
+                st.bar_chart(pd.Series(batch_sizes, name='Batches'))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,12 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+import occupancy_engine
+import occupancy_index
+import storage
 from utils import display_heading
 from menu import menu
 
-# Load authorized vehicles and parking data CSV files
-authorized_vehicles_df = pd.read_csv('datasets/authorized_vehicles.csv')
-vehicle_logs_df = pd.read_csv('datasets/indian_vehicle_parking_data.csv')
-
 def main():
     with open("style.css") as css:
         st.markdown(f'<style>{css.read()}</style>', unsafe_allow_html=True)
@@ -18,27 +17,33 @@ def main():
     st.title("Parking Insights")
     st.markdown("This page provides insights into parking data.")
 
+    # Current occupancy of every lot, kept by the occupancy engine from the gate events
+    st.header("Live Occupancy")
+    engine = occupancy_engine.get_engine()
+    if engine.high_watermark is None:
+        st.info("No entry or exit events recorded yet. Start multi_camera.py to follow the gates.")
+    else:
+        lots = pd.DataFrame.from_dict(engine.lot_occupancy(), orient='index')
+        lots.index.name = 'Lot'
+        for column, (lot, row) in zip(st.columns(len(lots)), lots.iterrows()):
+            capacity = f" / {row['capacity']:.0f}" if pd.notna(row['capacity']) else ""
+            column.metric(f"Lot {lot}", f"{row['occupied']}{capacity}")
+        st.caption(f"Last event at {engine.high_watermark}")
+
     # Date selection for maximum parked hour
     st.header("Find Hour with Maximum Cars Parked")
     max_parked_date = st.date_input("Select a date for max parked hour", datetime.today(), key="max_parked_date")
 
     max_parked_date = datetime.combine(max_parked_date, datetime.min.time())  # Set time to midnight
 
-    vehicle_logs_df['In Time'] = pd.to_datetime(vehicle_logs_df['In Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
-
-
-    logs_on_date = vehicle_logs_df[pd.to_datetime(vehicle_logs_df['In Time']).dt.date == max_parked_date.date()]
-
-    if not logs_on_date.empty:
-        # Group by hour and count number of vehicles parked
-        logs_on_date['Hour'] = pd.to_datetime(logs_on_date['In Time']).dt.hour
-        hour_counts = logs_on_date['Hour'].value_counts()
+    # Hourly rollup of the whole lot: entries, exits, cars present and peak cars present
+    hourly = storage.hourly_occupancy(max_parked_date.date())
 
-        if not hour_counts.empty:
-            max_hour = hour_counts.idxmax()
-            st.success(f"The hour with the maximum number of cars parked on {max_parked_date.date()} is {max_hour}:00.")
-        else:
-            st.info("No parking data available for this date.")
+    if not hourly.empty:
+        busiest = hourly.loc[hourly['Peak'].idxmax()]
+        st.success(f"The hour with the maximum number of cars parked on {max_parked_date.date()} is "
+                   f"{busiest['Time'].hour}:00, with {busiest['Peak']} cars parked at once.")
+        st.bar_chart(hourly.set_index(hourly['Time'].dt.hour)[['Present', 'Peak']])
     else:
         st.info("No parking data available for this date.")
 
@@ -52,17 +57,8 @@ def main():
     search_button = st.button("Search", key="search_occupancy")
 
     if search_button:
-        # Assuming vehicle_logs_df is your DataFrame containing datetime strings
-        vehicle_logs_df['Out Time'] = pd.to_datetime(vehicle_logs_df['Out Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
-
-        # Ensure 'Out Time' is in datetime format
-        vehicle_logs_df['Out Time'] = pd.to_datetime(vehicle_logs_df['Out Time'], errors='coerce')
-
-        # Filter logs for the selected date and time
-        logs_at_time = vehicle_logs_df[(pd.to_datetime(vehicle_logs_df['In Time']) <= occupancy_datetime) &
-                                       (vehicle_logs_df['Out Time'] >= occupancy_datetime)]
-
-        latest_logs = logs_at_time.sort_values(by='In Time').drop_duplicates(subset='Slot Number', keep='last')
+        # Latest session in progress in every slot at the selected date and time
+        latest_logs = occupancy_index.get_index().occupied_at(occupancy_datetime)
 
         if not latest_logs.empty:
             st.subheader("Current Parking Slot Occupancy")
@@ -75,23 +71,38 @@ def main():
         else:
             st.info("No parking data available at this time or the selected date and time.")
 
+    # Occupancy through the selected day, scrubbed with a slider
+    st.header("Occupancy Through the Day")
+    index = occupancy_index.get_index()
+    day_start = datetime.combine(occupancy_date, datetime.min.time())
+    day_end = day_start + timedelta(days=1) - timedelta(minutes=15)
+    st.line_chart(index.timeline(day_start, day_end))
+    scrub_time = st.slider("Time of day", min_value=day_start, max_value=day_end, value=day_start,
+                           step=timedelta(minutes=15), format="HH:mm", key="scrub_time")
+    scrub_logs = index.occupied_at(scrub_time)
+    st.metric("Occupied slots", len(scrub_logs))
+    if not scrub_logs.empty:
+        scrub_logs = scrub_logs.copy()
+        scrub_logs['In Time'] = scrub_logs['In Time'].dt.strftime('%d-%m-%Y %H:%M:%S')
+        scrub_logs['Out Time'] = scrub_logs['Out Time'].dt.strftime('%d-%m-%Y %H:%M:%S')
+        st.table(scrub_logs[['Slot Number', 'Vehicle Number', 'In Time', 'Out Time']].reset_index(drop=True))
+
     # Vehicle search by plate number and date
     st.header("Search Vehicle by Plate Number and Date")
     vehicle_plate = st.text_input("Enter Vehicle Number Plate", key="vehicle_plate")
     search_date = st.date_input("Select a date for search", datetime.today(), key="search_date")
 
     if st.button("Search", key="search_number"):
-        # Filter logs for the selected vehicle and date
-        vehicle_logs_filtered = vehicle_logs_df[(vehicle_logs_df['Vehicle Number'] == vehicle_plate) &
-                                                (pd.to_datetime(vehicle_logs_df['In Time']).dt.date == search_date)]
+        # Fetch logs for the selected vehicle and date
+        vehicle_logs_filtered = storage.sessions_for_vehicle_on_date(vehicle_plate, search_date)
 
         if not vehicle_logs_filtered.empty:
             st.success(f"Parking records found for Vehicle {vehicle_plate} on {search_date}:")
             # Sort by 'In Time' in ascending order before displaying
             vehicle_logs_filtered_sorted = vehicle_logs_filtered.sort_values(by='In Time')
             # Format date columns
-            vehicle_logs_filtered_sorted['In Time'] = pd.to_datetime(vehicle_logs_filtered_sorted['In Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
-            vehicle_logs_filtered_sorted['Out Time'] = pd.to_datetime(vehicle_logs_filtered_sorted['Out Time'], format='%d-%m-%Y %H:%M:%S', errors='coerce')
+            vehicle_logs_filtered_sorted['In Time'] = vehicle_logs_filtered_sorted['In Time'].dt.strftime('%d-%m-%Y %H:%M:%S')
+            vehicle_logs_filtered_sorted['Out Time'] = vehicle_logs_filtered_sorted['Out Time'].dt.strftime('%d-%m-%Y %H:%M:%S')
             st.table(vehicle_logs_filtered_sorted[['Slot Number', 'In Time', 'Out Time']].reset_index(drop=True))
         else:
             st.info(f"No parking record found for Vehicle {vehicle_plate} on {search_date}.")
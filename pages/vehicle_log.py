@@ -1,27 +1,48 @@
 import streamlit as st
 import pandas as pd
-from dateutil.parser import parse
+import storage
+import authorization
+import plate_matcher
+from plates import normalize_plate
 from utils import display_heading
 from menu import menu
 
-# Load authorized vehicles and parking data CSV files
-authorized_vehicles_df = pd.read_csv('datasets/authorized_vehicles.csv')
-vehicle_logs_df = pd.read_csv('datasets/indian_vehicle_parking_data.csv')
-
-def calculate_parking_time(row):
-    in_time = parse(row['In Time'])
-    out_time = parse(row['Out Time'])
-    total_parking_time = out_time - in_time
-    return total_parking_time
-
 def format_parking_time(delta):
     days = delta.days
     hours, remainder = divmod(delta.seconds, 3600)
     minutes, _ = divmod(remainder, 60)
     return f"{days} days {hours} hours {minutes} minutes"
 
-def format_datetime(dt):
-    return dt.strftime('%d-%m-%Y %H:%M:%S')
+def format_parking_times(durations):
+    # Vectorized format_parking_time() over a Series of timedeltas; missing durations become ''
+    seconds = (durations.dt.total_seconds().fillna(0) // 1).astype('int64')
+    days, remainder = seconds // 86400, seconds % 86400
+    formatted = (days.astype(str) + " days " + (remainder // 3600).astype(str) + " hours "
+                 + (remainder % 3600 // 60).astype(str) + " minutes")
+    return formatted.where(durations.notna(), '')
+
+def parking_time_stats(durations):
+    # Total, mean and longest stay of a vehicle from its session durations
+    return {
+        'Total': durations.sum(),
+        'Average': durations.mean(),
+        'Longest': durations.max(),
+    }
+
+def check_authorization(plate_number):
+    # Same normalized, auto-refreshing registry lookup as the gates, so both agree on a plate.
+    # Returns None when the registry file is missing.
+    try:
+        return authorization.get_index().is_authorized(plate_number)
+    except FileNotFoundError:
+        st.error("Authorized vehicles file not found.")
+        return None
+
+def similar_plates(plate_number):
+    try:
+        return plate_matcher.get_matcher().match(plate_number, budget_ms=50)
+    except FileNotFoundError:
+        return []
 
 def main():
     with open("style.css") as css:
@@ -44,35 +65,42 @@ def main():
 
         if submitted:
             # Check if vehicle is authorized
-            if plate_number in authorized_vehicles_df['Plate_Number'].values:
+            authorized = check_authorization(plate_number)
+            if authorized:
                 st.success(f"Vehicle {plate_number} is authorized.")
 
-                # Fetch logs for the vehicle from vehicle_logs_df
-                vehicle_logs = vehicle_logs_df[vehicle_logs_df['Vehicle Number'] == plate_number]
+                # Fetch logs for the vehicle from the parking database, oldest first
+                vehicle_logs = storage.sessions_for_vehicle(normalize_plate(plate_number))
 
                 if not vehicle_logs.empty:
                     st.markdown("### Vehicle Logs")
                     
-                    # Calculate total parking time for each log
-                    vehicle_logs['Total Parking Time'] = vehicle_logs.apply(calculate_parking_time, axis=1)
-                    
+                    # Parking time of every session, computed on whole columns
+                    durations = vehicle_logs['Out Time'] - vehicle_logs['In Time']
+
+                    # Total, average and longest parking time of the vehicle
+                    stats = parking_time_stats(durations)
+                    for column, (label, value) in zip(st.columns(len(stats)), stats.items()):
+                        column.metric(f"{label} Parking Time",
+                                      format_parking_time(value) if pd.notna(value) else "-")
+
                     # Format Total Parking Time for display
-                    vehicle_logs['Total Parking Time'] = vehicle_logs['Total Parking Time'].apply(format_parking_time)
+                    vehicle_logs['Total Parking Time'] = format_parking_times(durations)
 
                     # Format In Time and Out Time
-                    vehicle_logs['In Time'] = pd.to_datetime(vehicle_logs['In Time']).apply(format_datetime)
-                    vehicle_logs['Out Time'] = pd.to_datetime(vehicle_logs['Out Time']).apply(format_datetime)
-
-                    # Sort vehicle logs by 'In Time' from oldest to newest
-                    vehicle_logs.sort_values(by='In Time', inplace=True)
+                    vehicle_logs['In Time'] = vehicle_logs['In Time'].dt.strftime('%d-%m-%Y %H:%M:%S')
+                    vehicle_logs['Out Time'] = vehicle_logs['Out Time'].dt.strftime('%d-%m-%Y %H:%M:%S')
 
                     # Display the logs in a tabular format without showing index numbers
                     st.table(vehicle_logs[['Slot Number', 'In Time', 'Out Time', 'Total Parking Time']].reset_index(drop=True))
                 else:
                     st.info("No logs found for this vehicle in the last 30 days.")
                 
-            else:
+            elif authorized is not None:
                 st.error(f"Vehicle {plate_number} is not authorized.")
+                matches = similar_plates(plate_number)
+                if matches:
+                    st.info("Did you mean: " + ", ".join(plate for plate, _ in matches))
 
     st.markdown("<br><br>", unsafe_allow_html=True)
         
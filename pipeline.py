@@ -0,0 +1,188 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import metrics
+
+# Passed down the pipeline after the last item so every stage can finish and exit
+STOP = object()
+
+
+class BoundedQueue:
+    """
+    A bounded FIFO between two pipeline stages.
+
+    With drop_oldest=True a put() on a full queue discards the oldest item instead of
+    blocking, so a slow consumer never stalls its producer (e.g. the camera). Otherwise
+    put() blocks until there is room, which pushes back on the producer.
+    """
+
+    def __init__(self, maxsize, drop_oldest=False):
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if item is not STOP:
+                if self.drop_oldest:
+                    while len(self._items) >= self.maxsize:
+                        self._items.popleft()
+                        self.dropped += 1
+                else:
+                    while len(self._items) >= self.maxsize:
+                        self._cond.wait()
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Removes and returns the oldest item.
+
+        Raises:
+        queue.Empty: If nothing arrived within timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class Stage(threading.Thread):
+    """
+    A pipeline worker that applies func to every item from inbox and puts the result,
+    if it is not None, into outbox.
+
+    The source stage has no inbox: its func is called with no arguments and returns
+    the next item, or STOP when the input is exhausted. If flush is given it is
+    called once after the last item and its result, if not None, is passed on
+    before STOP.
+
+    If func raises, the stage records the error, stops the source and discards the
+    rest of its inbox up to STOP, so upstream stages blocked on a full queue can
+    finish instead of waiting forever.
+    """
+
+    def __init__(self, name, func, inbox=None, outbox=None, stop_event=None, flush=None):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.flush = flush
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop_event = stop_event or threading.Event()
+        self.processed = 0
+        self.busy_time = 0.0
+        self.started_at = None
+        self.error = None
+
+    def run(self):
+        self.started_at = time.perf_counter()
+        try:
+            while True:
+                if self.inbox is None:
+                    if self.stop_event.is_set():
+                        break
+                    start = time.perf_counter()
+                    result = self.func()
+                    if result is STOP:
+                        break
+                else:
+                    item = self.inbox.get()
+                    if item is STOP:
+                        break
+                    start = time.perf_counter()
+                    result = self.func(item)
+                elapsed = time.perf_counter() - start
+                self.busy_time += elapsed
+                metrics.observe(f'stage.{self.name}', elapsed)
+                self.processed += 1
+                if result is not None and self.outbox is not None:
+                    self.outbox.put(result)
+            if self.flush is not None:
+                result = self.flush()
+                if result is not None and self.outbox is not None:
+                    self.outbox.put(result)
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+            raise
+        finally:
+            if self.error is not None and self.inbox is not None:
+                while self.inbox.get() is not STOP:
+                    pass
+            if self.outbox is not None:
+                self.outbox.put(STOP)
+
+    def stats(self):
+        """
+        Returns items processed, throughput, the fraction of time spent working
+        and how many items were dropped from this stage's inbox.
+        """
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'processed': self.processed,
+            'per_second': self.processed / elapsed if elapsed else 0.0,
+            'busy': self.busy_time / elapsed if elapsed else 0.0,
+            'queued': len(self.inbox) if self.inbox is not None else 0,
+            'dropped': self.inbox.dropped if self.inbox is not None else 0,
+        }
+
+
+class Pipeline:
+    """
+    A chain of stages connected by bounded queues, started and stopped together.
+
+    stages is a list of (name, func, queue_size, drop_oldest) tuples, optionally
+    followed by a flush callable. The first func is the source; each later func
+    receives the previous stage's output through a BoundedQueue with the given
+    size and drop policy. Results of the last stage are put into self.output.
+    """
+
+    def __init__(self, stages, output_size=1, output_drop_oldest=True):
+        self.stop_event = threading.Event()
+        self.output = BoundedQueue(output_size, drop_oldest=output_drop_oldest)
+        self.stages = []
+        inbox = None
+        for i, (name, func, queue_size, drop_oldest, *flush) in enumerate(stages):
+            if i == len(stages) - 1:
+                outbox = self.output
+            else:
+                next_size, next_drop = stages[i + 1][2], stages[i + 1][3]
+                outbox = BoundedQueue(next_size, drop_oldest=next_drop)
+            self.stages.append(Stage(name, func, inbox, outbox, self.stop_event, *flush))
+            inbox = outbox
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        """
+        Asks the source to stop; the stages drain what is already queued and exit in order.
+        """
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        """
+        Waits for every stage to exit.
+
+        Raises:
+        Exception: The error of the first stage that failed, if any.
+        """
+        for stage in self.stages:
+            stage.join(timeout)
+        for stage in self.stages:
+            if stage.error is not None:
+                raise stage.error
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,186 @@
+import csv
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import metrics
+
+
+class PlateLogWriter:
+    """
+    Appends rows to a CSV log from a background thread.
+
+    write() only puts the row in an in-memory buffer, so callers on the frame loop never
+    wait for disk I/O. The writer thread flushes the buffer once it holds flush_rows
+    rows or flush_interval seconds have passed. The header is written once, when the
+    file is created empty.
+
+    durability controls what happens after each batch is written:
+    'none' leaves the data in Python's file buffer, 'flush' hands it to the OS and
+    'fsync' also waits for it to reach the disk.
+
+    The log is rotated to <name>.<YYYY-MM-DD>[.<n>].csv when it grows past
+    rotate_bytes. With rotate_daily, rows are written straight to <name>.<YYYY-MM-DD>.csv
+    for the day they are written on, so no existing file is ever renamed and path
+    itself is left untouched.
+    """
+
+    durabilities = ('none', 'flush', 'fsync')
+
+    def __init__(self, path, header=("NumberPlate", "Timestamp"), flush_rows=64, flush_interval=1.0,
+                 durability='flush', rotate_bytes=None, rotate_daily=False):
+        if durability not in self.durabilities:
+            raise ValueError(f"durability must be one of {self.durabilities}, not {durability!r}")
+        self.path = path
+        self.header = list(header) if header else None
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.rotations = 0
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._file = None
+        self._writer = None
+        self._file_day = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='plate-log-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def write(self, row):
+        """
+        Queues one row for writing. Never blocks on disk I/O.
+        """
+        with self._cond:
+            if self._closed:
+                raise ValueError("write to closed PlateLogWriter")
+            self._pending.append(row)
+            if len(self._pending) >= self.flush_rows:
+                self._cond.notify()
+
+    def close(self):
+        """
+        Writes every pending row, closes the file and stops the writer thread.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self._write_batch(self._take_pending())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'rows_written': self.rows_written,
+            'pending': pending,
+            'flushes': self.flushes,
+            'rotations': self.rotations,
+        }
+
+    def _take_pending(self):
+        with self._cond:
+            rows, self._pending = self._pending, []
+            return rows
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.flush_rows,
+                                    max(0.0, deadline - time.monotonic()))
+                closed = self._closed
+            self._write_batch(self._take_pending())
+            deadline = time.monotonic() + self.flush_interval
+            if closed:
+                break
+
+    def _write_batch(self, rows):
+        if not rows:
+            return
+        with metrics.timer('plate_log.write_batch'):
+            self._write_rows(rows)
+
+    def _write_rows(self, rows):
+        self._open()
+        for row in rows:
+            self._maybe_rotate()
+            self._writer.writerow(row)
+        self.rows_written += len(rows)
+
+        if self.durability != 'none':
+            self._file.flush()
+        if self.durability == 'fsync':
+            os.fsync(self._file.fileno())
+        self.flushes += 1
+
+    def current_path(self):
+        """
+        Returns the file rows are written to now: path, or today's dated file with rotate_daily.
+        """
+        if not self.rotate_daily:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{date.today().isoformat()}{ext}"
+
+    def _open(self):
+        if self._file is not None:
+            return
+        path = self.current_path()
+        self._file = open(path, "a", newline='')
+        self._writer = csv.writer(self._file)
+        self._file.seek(0, 2)
+        if self._file.tell() == 0:
+            self._file_day = date.today()
+            if self.header:
+                self._writer.writerow(self.header)
+        elif self.rotate_daily:
+            self._file_day = date.today()
+        else:
+            self._file_day = datetime.fromtimestamp(os.path.getmtime(path)).date()
+
+    def _maybe_rotate(self):
+        if self.rotate_daily and date.today() != self._file_day:
+            # Start the new day's file; the previous day's file keeps its name
+            self._file.close()
+            self._file = None
+            self.rotations += 1
+            self._open()
+        if self.rotate_bytes is None or self._file.tell() < self.rotate_bytes:
+            return
+
+        self._file.close()
+        path = self.current_path()
+        # With rotate_daily the dated name is taken by path itself, so this moves on to <n> = 1
+        root, ext = os.path.splitext(self.path)
+        rotated = f"{root}.{self._file_day.isoformat()}{ext}"
+        n = 1
+        while os.path.exists(rotated):
+            rotated = f"{root}.{self._file_day.isoformat()}.{n}{ext}"
+            n += 1
+        os.replace(path, rotated)
+        self.rotations += 1
+        self._file = None
+        self._open()
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import numpy as np
+
+import authorization
+from plates import normalize_plate
+
+# Characters tesseract mixes up on plates. Each group folds to its first character.
+CONFUSION_GROUPS = ['0ODQ', '1IL', '8B', '5S', '2Z', '6G']
+# Substitution cost between two characters of the same group; other edits cost 1
+confusion_cost = 0.25
+
+FOLD = {char: group[0] for group in CONFUSION_GROUPS for char in group}
+_fold_table = str.maketrans(FOLD)
+_hash_mask = (1 << 64) - 1
+
+
+def fold(plate):
+    """
+    Maps every confusable character to its group representative, so 'MH12AB1234' and 'MHI2A81234' fold alike.
+    """
+    return plate.translate(_fold_table)
+
+
+def plate_distance(a, b):
+    """
+    Edit distance between two plates where insertions, deletions and substitutions
+    cost 1, except substitutions between OCR-confusable characters, which cost confusion_cost.
+    """
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [float(i)]
+        fa = FOLD.get(ca, ca)
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                substitution = 0.0
+            elif fa == FOLD.get(cb, cb):
+                substitution = confusion_cost
+            else:
+                substitution = 1.0
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + substitution))
+        previous = current
+    return previous[-1]
+
+
+def _keys(folded):
+    # The folded plate and every single-character deletion of it. Two plates within one
+    # folded edit of each other always share at least one key.
+    yield folded
+    for i in range(len(folded)):
+        yield folded[:i] + folded[i + 1:]
+
+
+def _hash(key):
+    return hash(key) & _hash_mask
+
+
+class PlateMatcher:
+    """
+    Fuzzy index over registered plates for OCR reads that do not match exactly.
+
+    Plates are folded over OCR confusion groups and indexed by the hashes of the folded
+    plate and its single-character deletions, stored as sorted NumPy arrays. A query
+    looks up its own keys with searchsorted, which finds every plate within one folded
+    edit without scanning the registry, and ranks those candidates by plate_distance().
+    """
+
+    def __init__(self, plates=()):
+        self.plates = []
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._ids = np.empty(0, dtype=np.int64)
+        # Plates added after the arrays were built, indexed by key hash
+        self._extra = {}
+        self.build(plates)
+
+    def build(self, plates):
+        self.plates = [normalize_plate(plate) for plate in plates]
+        hashes, ids = [], []
+        for plate_id, plate in enumerate(self.plates):
+            for key in set(_keys(fold(plate))):
+                hashes.append(_hash(key))
+                ids.append(plate_id)
+        hashes = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        order = np.argsort(hashes, kind='stable')
+        self._hashes = hashes[order]
+        self._ids = np.asarray(ids, dtype=np.int64)[order]
+        self._extra = {}
+
+    def add(self, plate):
+        plate_id = len(self.plates)
+        self.plates.append(normalize_plate(plate))
+        for key in set(_keys(fold(self.plates[plate_id]))):
+            self._extra.setdefault(_hash(key), []).append(plate_id)
+
+    def __len__(self):
+        return len(self.plates)
+
+    def candidates(self, text):
+        """
+        Returns the ids of plates sharing a key with the folded text.
+        """
+        hashes = np.fromiter((_hash(key) for key in set(_keys(fold(text)))), dtype=np.uint64)
+        starts = np.searchsorted(self._hashes, hashes, side='left')
+        ends = np.searchsorted(self._hashes, hashes, side='right')
+        ids = set()
+        for start, end in zip(starts, ends):
+            ids.update(self._ids[start:end].tolist())
+        for h in hashes.tolist():
+            ids.update(self._extra.get(h, ()))
+        return ids
+
+    def match(self, text, k=3, max_distance=1.5, budget_ms=None):
+        """
+        Finds the registered plates closest to an OCR read.
+
+        Parameters:
+        text (str): The plate as read by OCR.
+        k (int): Maximum number of candidates returned.
+        max_distance (float): Largest plate_distance() returned.
+        budget_ms (float): Stop ranking candidates after this many milliseconds and
+        return the best found so far.
+
+        Returns:
+        list: Up to k (plate, distance) tuples, closest first.
+        """
+        start = time.perf_counter()
+        text = normalize_plate(text)
+        deadline = start + budget_ms / 1000 if budget_ms is not None else None
+
+        matches = []
+        seen = set()
+        for plate_id in self.candidates(text):
+            plate = self.plates[plate_id]
+            if plate in seen:
+                continue
+            seen.add(plate)
+            distance = plate_distance(text, plate)
+            if distance <= max_distance:
+                matches.append((distance, plate))
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        matches.sort()
+        return [(plate, distance) for distance, plate in matches[:k]]
+
+
+_matcher = None
+_synced = (None, 0)
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """
+    Returns the process-wide matcher over the authorization index, bringing it up to date first.
+
+    Plates appended to the registry are added incrementally; a full reload of the
+    registry rebuilds the matcher.
+    """
+    global _matcher, _synced
+
+    index = authorization.get_index()
+    index.refresh()
+    with _matcher_lock:
+        generation, appended = _synced
+        if _matcher is None or generation != index.reloads:
+            _matcher = PlateMatcher(index.plates())
+            _synced = (index.reloads, len(index.appended))
+        elif appended < len(index.appended):
+            for plate in index.appended[appended:]:
+                _matcher.add(plate)
+            _synced = (generation, len(index.appended))
+        return _matcher
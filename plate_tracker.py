@@ -0,0 +1,161 @@
+import heapq
+import itertools
+from collections import Counter
+
+import cv2
+
+
+def iou(a, b):
+    """
+    Intersection over union of two (xmin, ymin, xmax, ymax) boxes.
+    """
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def crop_quality(crop):
+    """
+    Scores a plate crop for OCR: sharper (higher Laplacian variance) and larger crops score higher.
+    """
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    return cv2.Laplacian(gray, cv2.CV_64F).var() * crop.shape[0] * crop.shape[1]
+
+
+def vote(texts):
+    """
+    Combines several OCR reads of the same plate into one string.
+
+    The most common read wins if it was seen more than once; otherwise the reads of the
+    most common length are combined by a per-character majority vote.
+
+    Parameters:
+    texts (list): OCR results for crops of one track.
+
+    Returns:
+    str: The voted plate text, or '' if every read was empty.
+    """
+    texts = [text for text in texts if text]
+    if not texts:
+        return ''
+    text, count = Counter(texts).most_common(1)[0]
+    if count > 1 or len(texts) == 1:
+        return text
+    length = Counter(len(text) for text in texts).most_common(1)[0][0]
+    same_length = [text for text in texts if len(text) == length]
+    return ''.join(Counter(chars).most_common(1)[0][0] for chars in zip(*same_length))
+
+
+class Track:
+    """
+    One plate followed across frames, with the best crops seen so far kept for OCR.
+    """
+
+    def __init__(self, track_id, box, frame_index, max_candidates):
+        self.track_id = track_id
+        self.box = box
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.hits = 0
+        self.max_candidates = max_candidates
+        # Min-heap of (quality, seq, crop), so the worst kept crop is replaced first
+        self._candidates = []
+        self._seq = itertools.count()
+
+    def add(self, box, crop, frame_index):
+        self.box = box
+        self.last_frame = frame_index
+        self.hits += 1
+        quality = crop_quality(crop)
+        if len(self._candidates) < self.max_candidates:
+            heapq.heappush(self._candidates, (quality, next(self._seq), crop.copy()))
+        elif quality > self._candidates[0][0]:
+            heapq.heapreplace(self._candidates, (quality, next(self._seq), crop.copy()))
+
+    def best_crops(self):
+        """
+        Returns the kept crops, best first.
+        """
+        return [crop for _, _, crop in sorted(self._candidates, reverse=True)]
+
+
+class PlateTracker:
+    """
+    Greedy IoU / centroid tracker that assigns track IDs to plate boxes across frames.
+
+    A detection joins the existing track whose last box overlaps it most (IoU at least
+    iou_threshold) or, failing that, whose centre is within max_centroid_distance box
+    diagonals. A track ends after max_missed frames without a detection.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_missed=10,
+                 max_candidates=3, min_hits=2):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_missed = max_missed
+        self.max_candidates = max_candidates
+        # Tracks seen on fewer frames are treated as false detections and dropped
+        self.min_hits = min_hits
+        self.frame_index = 0
+        self.tracks = {}
+        self._ids = itertools.count(1)
+
+    def _centroid_distance(self, a, b):
+        ax, ay = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+        bx, by = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+        diagonal = ((b[2] - b[0]) ** 2 + (b[3] - b[1]) ** 2) ** 0.5 or 1.0
+        return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / diagonal
+
+    def update(self, detections):
+        """
+        Associates one frame's detections with the current tracks.
+
+        Parameters:
+        detections (list): (box, crop) pairs, where box is (xmin, ymin, xmax, ymax).
+
+        Returns:
+        tuple: The track ID assigned to each detection, in order, and the list of
+        tracks that ended on this frame.
+        """
+        self.frame_index += 1
+        pairs = []
+        for d, (box, _) in enumerate(detections):
+            for track_id, track in self.tracks.items():
+                overlap = iou(box, track.box)
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, d, track_id))
+                elif self._centroid_distance(box, track.box) <= self.max_centroid_distance:
+                    # Rank centroid matches below any IoU match
+                    pairs.append((-self._centroid_distance(box, track.box), d, track_id))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(detections)
+        used_tracks = set()
+        for _, d, track_id in pairs:
+            if assigned[d] is None and track_id not in used_tracks:
+                assigned[d] = track_id
+                used_tracks.add(track_id)
+
+        for d, (box, crop) in enumerate(detections):
+            if assigned[d] is None:
+                assigned[d] = next(self._ids)
+                self.tracks[assigned[d]] = Track(assigned[d], box, self.frame_index, self.max_candidates)
+            self.tracks[assigned[d]].add(box, crop, self.frame_index)
+
+        ended = [track_id for track_id, track in self.tracks.items()
+                 if self.frame_index - track.last_frame > self.max_missed]
+        return assigned, self._finish(ended)
+
+    def flush(self):
+        """
+        Ends every open track, e.g. at the end of the video.
+        """
+        return self._finish(list(self.tracks))
+
+    def _finish(self, track_ids):
+        finished = [self.tracks.pop(track_id) for track_id in track_ids]
+        return [track for track in finished if track.hits >= self.min_hits]
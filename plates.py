@@ -0,0 +1,177 @@
+import argparse
+import re
+import string
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Dictionary mapping state codes to their corresponding states in India
+state_codes = {
+    'AP': 'Andhra Pradesh', 'AR': 'Arunachal Pradesh', 'AS': 'Assam', 'BR': 'Bihar', 'CG': 'Chhattisgarh',
+    'GA': 'Goa', 'GJ': 'Gujarat', 'HR': 'Haryana', 'HP': 'Himachal Pradesh', 'JK': 'Jammu and Kashmir',
+    'JH': 'Jharkhand', 'KA': 'Karnataka', 'KL': 'Kerala', 'MP': 'Madhya Pradesh', 'MH': 'Maharashtra',
+    'MN': 'Manipur', 'ML': 'Meghalaya', 'MZ': 'Mizoram', 'NL': 'Nagaland', 'OD': 'Odisha', 'PB': 'Punjab',
+    'RJ': 'Rajasthan', 'SK': 'Sikkim', 'TN': 'Tamil Nadu', 'TS': 'Telangana', 'TR': 'Tripura', 'UP': 'Uttar Pradesh',
+    'UK': 'Uttarakhand', 'WB': 'West Bengal', 'AN': 'Andaman and Nicobar Islands', 'CH': 'Chandigarh',
+    'DN': 'Dadra and Nagar Haveli and Daman and Diu',
+    'DL': 'Delhi', 'LD': 'Lakshadweep', 'PY': 'Puducherry'
+}
+
+
+def normalize_plate(text):
+    """
+    Reduces a plate to uppercase letters and digits, so 'mh 12-ab 1234' matches 'MH12AB1234'.
+    """
+    return re.sub(r'[^A-Z0-9]', '', str(text).upper())
+
+
+def clean_number_plate(text):
+    # Remove special characters from the beginning and end
+    cleaned_text = text.strip(string.punctuation + '~' + '|' + '!' + '-' + '_' + '(' + ')' + '{' + '}')
+    # Remove special characters except for alphanumeric and spaces
+    cleaned_text = re.sub(r'[^A-Za-z0-9\s]', '', text)
+    # Remove any extra spaces
+    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
+
+    if not cleaned_text:
+        return cleaned_text  # Return immediately if cleaned_text is empty
+
+    if cleaned_text[0] == 'I':
+        cleaned_text = cleaned_text[1::]
+    return cleaned_text
+
+
+def correct_state_code(text):
+    if len(text) < 3:
+        return "", text
+    # Check various possible combinations for a valid state code
+    possible_codes = [text[:2], text[1:3], text[0] + text[2]]
+    for code in possible_codes:
+        if code in state_codes:
+            corrected_text = text[:2] + text[2:]  # Only replace the state code part
+            return code, corrected_text
+    return None, text
+
+
+def analyze_number_plate(text):
+    # Clean the number plate text
+    cleaned_text = clean_number_plate(text)
+    # Correct the state code
+    state_code, corrected_text = correct_state_code(cleaned_text)
+    if state_code:
+        state = state_codes[state_code]
+        # Remove spaces from the corrected text
+        corrected_text_without_spaces = corrected_text.replace(" ", "")
+        return f"The number plate belongs to {state} with the state code {state_code}.", corrected_text_without_spaces
+    else:
+        return "The state code could not be identified.", text
+
+
+def clean_number_plates(texts):
+    """
+    Vectorized clean_number_plate() over a Series of OCR texts.
+    """
+    cleaned = texts.fillna('').astype(str)
+    cleaned = cleaned.str.replace(r'[^A-Za-z0-9\s]', '', regex=True)
+    cleaned = cleaned.str.replace(r'\s+', ' ', regex=True).str.strip()
+    return cleaned.str.replace(r'^I', '', regex=True)
+
+
+def correct_state_codes(cleaned):
+    """
+    Vectorized correct_state_code() over a Series of cleaned plates.
+
+    Returns:
+    Series: The state code of each plate, '' for plates shorter than 3 characters
+    and None where no valid code was found.
+    """
+    candidates = [cleaned.str[:2], cleaned.str[1:3], cleaned.str[0] + cleaned.str[2]]
+    codes = np.full(len(cleaned), None, dtype=object)
+    # Fill from the lowest priority candidate up so the first valid one wins
+    for candidate in reversed(candidates):
+        valid = candidate.isin(state_codes).to_numpy()
+        codes[valid] = candidate.to_numpy()[valid]
+    codes[(cleaned.str.len() < 3).to_numpy()] = ''
+    return pd.Series(codes, index=cleaned.index, dtype=object)
+
+
+def analyze_number_plates(texts):
+    """
+    Vectorized analyze_number_plate() over a Series of OCR texts.
+
+    Returns:
+    DataFrame: With columns Plate (the corrected plate, or the original text when no
+    state code was found), StateCode, State and Analysis, indexed like texts.
+    """
+    cleaned = clean_number_plates(texts)
+    codes = correct_state_codes(cleaned)
+    found = codes.isin(state_codes)
+    states = codes.map(state_codes).where(found, None)
+
+    plates = cleaned.str.replace(' ', '', regex=False).where(found, texts)
+    analysis = pd.Series("The state code could not be identified.", index=texts.index, dtype=object)
+    analysis[found] = ("The number plate belongs to " + states[found] + " with the state code "
+                       + codes[found] + ".")
+    return pd.DataFrame({
+        'Plate': plates,
+        'StateCode': codes.where(found, None),
+        'State': states,
+        'Analysis': analysis,
+    })
+
+
+def clean_sightings(source, destination, column='NumberPlate', chunksize=100_000, valid_only=False):
+    """
+    Cleans a raw sightings CSV such as datasets/car_plate_data.csv chunk by chunk.
+
+    The plate column is replaced by the corrected plate and StateCode and State columns
+    are added. Empty reads are dropped, and with valid_only so are plates without a
+    recognised state code. Memory use is bounded by chunksize.
+
+    Returns:
+    tuple: Rows read and rows written.
+    """
+    rows_read = rows_written = 0
+    header = True
+    with open(destination, 'w', newline='') as out:
+        for chunk in pd.read_csv(source, chunksize=chunksize, dtype=str, encoding_errors='replace'):
+            rows_read += len(chunk)
+            cleaned = clean_number_plates(chunk[column])
+            codes = correct_state_codes(cleaned)
+            found = codes.isin(state_codes)
+            chunk[column] = cleaned.str.replace(' ', '', regex=False)
+            chunk['StateCode'] = codes.where(found, None)
+            chunk['State'] = codes.map(state_codes).where(found, None)
+
+            keep = chunk[column].str.len() > 0
+            if valid_only:
+                keep &= chunk['StateCode'].notna()
+            chunk = chunk[keep]
+
+            chunk.to_csv(out, header=header, index=False)
+            header = False
+            rows_written += len(chunk)
+    return rows_read, rows_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Clean and state-code-validate raw number plate sightings.')
+    parser.add_argument('source', nargs='?', default='datasets/car_plate_data.csv')
+    parser.add_argument('destination', nargs='?', default='datasets/car_plate_data_cleaned.csv')
+    parser.add_argument('--column', default='NumberPlate', help='column holding the OCR text')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='rows processed at a time')
+    parser.add_argument('--valid-only', action='store_true', help='drop plates without a valid state code')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows_read, rows_written = clean_sightings(args.source, args.destination, args.column,
+                                              args.chunksize, args.valid_only)
+    elapsed = time.perf_counter() - start
+    print(f"Cleaned {rows_read} rows into {rows_written} rows of {args.destination} "
+          f"in {elapsed:.1f}s ({rows_read / elapsed if elapsed else 0:.0f} rows/s).", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
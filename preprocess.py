@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+import metrics
+
+
+class InputWriter:
+    """
+    Converts BGR frames straight into an interpreter's input tensor.
+
+    Each frame is resized into the tensor (or, for float models, into one
+    preallocated uint8 buffer) and the channels are swapped to RGB in place after
+    the resize, when the image is already at model size. Float models are then
+    normalized in place into the tensor as (x - mean) / std, in the same order and
+    float32 precision as before, so the values are bit-identical. Nothing is
+    allocated per frame.
+
+    The writer holds the view returned by interpreter.tensor() only while writing,
+    since TensorFlow Lite refuses to invoke() or reallocate while a view is alive.
+    One writer belongs to one interpreter and must not be shared between threads.
+    """
+
+    def __init__(self, interpreter, input_detail, mean=127.5, std=127.5):
+        """
+        Parameters:
+        interpreter (Interpreter): Interpreter whose input tensor is written.
+        input_detail (dict): Entry of get_input_details() describing that tensor.
+        mean (float): Value subtracted from each pixel for float models.
+        std (float): Value each pixel is divided by for float models, after subtracting mean.
+        """
+        self.interpreter = interpreter
+        self.index = input_detail['index']
+        self.height = int(input_detail['shape'][1])
+        self.width = int(input_detail['shape'][2])
+        self.float_input = (input_detail['dtype'] == np.float32)
+        self.mean = np.float32(mean)
+        self.std = np.float32(std)
+        self._resized = np.empty((self.height, self.width, 3), dtype=np.uint8) if self.float_input else None
+
+    def write(self, images):
+        """
+        Writes images into the first len(images) entries of the input tensor's batch dimension.
+
+        Parameters:
+        images (list): Image arrays in BGR format (OpenCV).
+        """
+        tensor = self.interpreter.tensor(self.index)()
+        try:
+            for i, image in enumerate(images):
+                self.convert(image, tensor[i])
+        finally:
+            del tensor
+
+    def convert(self, image, out):
+        """
+        Converts one BGR image into out, an array of the model's input shape without the batch dimension.
+        """
+        resized = self._resized if self.float_input else out
+        with metrics.timer('detect.resize'):
+            cv2.resize(image, (self.width, self.height), dst=resized)
+        with metrics.timer('detect.color'):
+            cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=resized)
+        if self.float_input:
+            with metrics.timer('detect.normalize'):
+                np.subtract(resized, self.mean, out=out)
+                np.divide(out, self.std, out=out)
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+# Same ISO text format as the parking_sessions timestamps
+time_format = '%Y-%m-%d %H:%M:%S'
+# Rollup granularities and the pandas frequency of their buckets
+granularities = {'hour': 'h', 'day': 'D'}
+# slot_number of the rows covering the whole lot
+LOT = 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS occupancy_rollups (
+    granularity TEXT NOT NULL,
+    slot_number INTEGER NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    entries INTEGER NOT NULL,
+    exits INTEGER NOT NULL,
+    present INTEGER NOT NULL,
+    peak INTEGER NOT NULL,
+    PRIMARY KEY (granularity, slot_number, bucket)
+) WITHOUT ROWID;
+"""
+
+UPSERT = """
+    INSERT INTO occupancy_rollups (granularity, slot_number, bucket, entries, exits, present, peak)
+    VALUES (?, ?, ?, ?, ?, 1, ?)
+    ON CONFLICT (granularity, slot_number, bucket) DO UPDATE SET
+        entries = entries + excluded.entries,
+        exits = exits + excluded.exits,
+        present = present + 1,
+        peak = peak + excluded.peak
+"""
+
+
+def _rollup_frame(starts, ends, scopes, freq):
+    # Occupancy rows for one granularity from closed sessions, by sweeping their entry
+    # (+1) and exit (-1) events in time order within each scope. Entries sort before
+    # exits at the same instant, since a car is present at both its In and Out Time.
+    step = pd.Timedelta(1, unit=freq)
+    scope = np.concatenate([scopes, scopes])
+    time = np.concatenate([starts, ends])
+    delta = np.concatenate([np.ones(len(starts), dtype=np.int64), -np.ones(len(ends), dtype=np.int64)])
+    order = np.lexsort((-delta, time, scope))
+    events = pd.DataFrame({'scope': scope[order], 'time': time[order], 'delta': delta[order]})
+    events['level'] = events.groupby('scope')['delta'].cumsum()
+    events['before'] = events['level'] - events['delta']
+    events['bucket'] = events['time'].dt.floor(freq)
+    events['entry'] = events['delta'] > 0
+
+    rows = events.groupby(['scope', 'bucket'], sort=True).agg(
+        entries=('entry', 'sum'), events=('delta', 'size'), level=('level', 'max'),
+        carried=('before', 'first'), last=('level', 'last')).reset_index()
+    rows['exits'] = rows['events'] - rows['entries']
+    rows['present'] = rows['carried'] + rows['entries']
+    rows['peak'] = np.maximum(rows['level'], rows['carried'])
+
+    # Buckets without events between two that have them hold the cars still parked
+    next_bucket = rows.groupby('scope')['bucket'].shift(-1)
+    gaps = ((next_bucket - rows['bucket']) // step - 1).fillna(0).astype(np.int64)
+    gaps = gaps.where(rows['last'] > 0, 0).to_numpy()
+    source = np.repeat(np.arange(len(rows)), gaps)
+    offsets = np.arange(gaps.sum()) - np.repeat(np.cumsum(gaps) - gaps, gaps) + 1
+    filler = pd.DataFrame({
+        'scope': rows['scope'].to_numpy()[source],
+        'bucket': rows['bucket'].to_numpy()[source] + offsets * step.to_timedelta64(),
+        'entries': 0,
+        'exits': 0,
+        'present': rows['last'].to_numpy()[source],
+        'peak': rows['last'].to_numpy()[source],
+    })
+    columns = ['scope', 'bucket', 'entries', 'exits', 'present', 'peak']
+    return pd.concat([rows[columns], filler], ignore_index=True)
+
+
+def rebuild(conn):
+    """
+    Recomputes every rollup row from the parking_sessions table.
+
+    Each session counts towards its slot and towards the whole lot (slot_number 0).
+    Sessions without an Out Time only count as entries.
+    """
+    sessions = pd.read_sql_query('SELECT in_time, out_time, slot_number FROM parking_sessions', conn)
+    starts = pd.to_datetime(sessions['in_time'], format=time_format)
+    ends = pd.to_datetime(sessions['out_time'], format=time_format)
+    closed = ends.notna().to_numpy()
+    slots = sessions['slot_number']
+    has_slot = slots.notna().to_numpy() & closed
+
+    conn.execute('DELETE FROM occupancy_rollups')
+    for granularity, freq in granularities.items():
+        frame = _rollup_frame(
+            np.concatenate([starts[closed].to_numpy(), starts[has_slot].to_numpy()]),
+            np.concatenate([ends[closed].to_numpy(), ends[has_slot].to_numpy()]),
+            np.concatenate([np.full(closed.sum(), LOT), slots[has_slot].astype(np.int64).to_numpy()]),
+            freq)
+        # Open sessions add to their entry bucket's entries only
+        open_entries = pd.DataFrame({'bucket': starts[~closed].dt.floor(freq), 'slot': slots[~closed]})
+        columns = [frame[column].astype('int64').tolist()
+                   for column in ('scope', 'entries', 'exits', 'present', 'peak')]
+        buckets = frame['bucket'].dt.strftime(time_format).tolist()
+        conn.executemany('INSERT INTO occupancy_rollups VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         zip([granularity] * len(frame), columns[0], buckets, *columns[1:]))
+        for bucket, slot in open_entries.itertuples(index=False, name=None):
+            for scope in [LOT] if pd.isna(slot) else [LOT, int(slot)]:
+                _add_entry(conn, granularity, scope, bucket)
+
+
+def _add_entry(conn, granularity, scope, bucket):
+    conn.execute("""
+        INSERT INTO occupancy_rollups VALUES (?, ?, ?, 1, 0, 0, 0)
+        ON CONFLICT (granularity, slot_number, bucket) DO UPDATE SET entries = entries + 1
+    """, (granularity, scope, bucket.strftime(time_format)))
+
+
+def _bucket_peak(conn, scope, start, end, max_duration):
+    # Highest number of cars present at once between start and end, from the sessions overlapping the bucket
+    query = ('SELECT in_time, out_time FROM parking_sessions '
+             'WHERE in_time >= ? AND in_time < ? AND out_time >= ?')
+    params = [(start - max_duration).strftime(time_format), end.strftime(time_format), start.strftime(time_format)]
+    if scope != LOT:
+        query += ' AND slot_number = ?'
+        params.append(scope)
+
+    level = 0
+    events = []
+    for in_time, out_time in conn.execute(query, params):
+        if in_time < params[2]:
+            level += 1
+        else:
+            events.append((in_time, 1))
+        if out_time < params[1]:
+            events.append((out_time, -1))
+    peak = level
+    for _, delta in sorted(events, key=lambda event: (event[0], -event[1])):
+        level += delta
+        peak = max(peak, level)
+    return peak
+
+
+def add_session(conn, in_time, out_time=None, slot_number=None, max_duration=pd.Timedelta(0)):
+    """
+    Updates the rollups for one session already inserted into parking_sessions.
+
+    Only the buckets the session touches are written: present goes up by one in each,
+    peak by one in the buckets the session covers completely, and the peak of the
+    entry and exit buckets is recomputed from the sessions overlapping them.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection to the parking database, inside the transaction that added the session.
+    in_time (datetime): Start of the session.
+    out_time (datetime): End of the session, or None while the vehicle is still parked.
+    slot_number (int): Slot of the session, or None.
+    max_duration (timedelta): Longest recorded session, bounding the sessions that can overlap a bucket.
+    """
+    scopes = [LOT] if slot_number is None else [LOT, int(slot_number)]
+    in_time = pd.Timestamp(in_time)
+    for granularity, freq in granularities.items():
+        first = in_time.floor(freq)
+        if out_time is None:
+            for scope in scopes:
+                _add_entry(conn, granularity, scope, first)
+            continue
+
+        last = pd.Timestamp(out_time).floor(freq)
+        buckets = pd.date_range(first, last, freq=freq)
+        for scope in scopes:
+            conn.executemany(UPSERT, (
+                (granularity, scope, bucket.strftime(time_format), int(bucket == first), int(bucket == last),
+                 int(first < bucket < last))
+                for bucket in buckets))
+            step = pd.Timedelta(1, unit=freq)
+            for bucket in {first, last}:
+                conn.execute('UPDATE occupancy_rollups SET peak = ? WHERE granularity = ? AND slot_number = ? '
+                             'AND bucket = ?',
+                             (_bucket_peak(conn, scope, bucket, bucket + step, max_duration),
+                              granularity, scope, bucket.strftime(time_format)))
+
+
+def query(conn, granularity, start, end, slot_number=LOT):
+    """
+    Returns the rollup rows of one slot, or of the whole lot, with buckets from start
+    up to but excluding end. Buckets in which no car was present are left out.
+    """
+    return pd.read_sql_query(
+        'SELECT bucket AS "Time", entries AS "Entries", exits AS "Exits", present AS "Present", peak AS "Peak" '
+        'FROM occupancy_rollups WHERE granularity = ? AND slot_number = ? AND bucket >= ? AND bucket < ? '
+        'ORDER BY bucket',
+        conn, params=(granularity, slot_number, start.strftime(time_format), end.strftime(time_format)),
+        parse_dates=['Time'])
@@ -1,116 +1,235 @@
-import numpy as np
-import csv
 import cv2
-import os
-import pandas as pd
-import sys
-import glob
-import cvzone
-import random
-import importlib.util
+import queue
+import time
 from datetime import datetime
-import pytesseract
-from tensorflow.lite.python.interpreter import Interpreter
+from functools import partial
+import ocr
+from ocr_cache import OcrCache
+from motion_gate import MotionGate
+from plate_tracker import PlateTracker, vote
+from plate_log import PlateLogWriter
+import authorization
+import detect
+import detect_client
+import metrics
+from pipeline import Pipeline, STOP
 
-import matplotlib
-import matplotlib.pyplot as plt
 
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\\tesseract.exe'
-
-modelpath = 'detect.tflite'
 lblpath = 'labelmap.txt'
 min_conf = 0.99
-cap = cv2.VideoCapture('datasets/demo.mp4')
-
-interpreter = Interpreter(model_path=modelpath)
-interpreter.allocate_tensors()
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
-height = input_details[0]['shape'][1]
-width = input_details[0]['shape'][2]
-
-float_input = (input_details[0]['dtype'] == np.float32)
-
-input_mean = 127.5
-input_std = 127.5
+video_source = 'datasets/demo.mp4'
+csv_path = "datasets/car_plate_data.csv"
+
+# Bounded queue sizes between the capture -> detect -> track -> OCR -> persist stages.
+# Frames waiting for detection are dropped oldest-first so capture never blocks on inference.
+frame_queue_size = 2
+detection_queue_size = 4
+track_queue_size = 4
+plate_queue_size = 4
+# Seconds between per-stage throughput reports
+stats_interval = 10
+# Lane region (x, y, w, h) in frame pixels watched for motion, or None for the whole frame
+lane_roi = None
+
+# Detection runs on detect_server.py when DETECT_SERVER_URL is set, otherwise on detect.py's
+# interpreter pool, which loads tflite_runtime when it is installed. The detect stage runs one
+# frame at a time, so a single interpreter is enough unless DETECT_POOL_SIZE says otherwise.
+detect.pool_size = detect.pool_size or 1
+detect.min_conf = min_conf
+
+# Persistent OCR engine with tesseract's default page segmentation, as before
+ocr_engine = ocr.get_engine()
+# Reuses the OCR result for near-identical crops of the same track
+ocr_cache = OcrCache()
+# Skips inference while the lane is empty
+motion_gate = MotionGate(roi=lane_roi)
+# Follows each plate across frames so a passage is OCR'd from its best crops and logged once
+plate_tracker = PlateTracker()
+# Background CSV writer, so the persist stage never waits on disk I/O
+plate_log = PlateLogWriter(csv_path, flush_rows=64, flush_interval=1.0, durability='flush')
 
 list1 = []
-processed_numbers = set()
-
-with open("datasets/car_plate_data.csv", "a", newline='') as csvfile:
-
-
-    csvfile.seek(0, 2)
-    if csvfile.tell() == 0:
-        writer = csv.writer(csvfile)
-        writer.writerow(["NumberPlate", "Timestamp"])
 
 with open(lblpath, 'r') as f:
     labels = [line.strip() for line in f.readlines()]
 
-while (True):
-    ret, frame = cap.read()
-    image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    imH, imW, _ = frame.shape
-    image_resized = cv2.resize(image_rgb, (width, height))
-    input_data = np.expand_dims(image_resized, axis=0)
-
-    if float_input:
-        input_data = (np.float32(input_data) - input_mean) / input_std
 
+def capture_frame(cap):
+    """
+    Capture stage: reads the next frame from the video source, or returns STOP at the end of the stream.
+    """
+    ret, frame = cap.read()
+    if not ret:
+        return STOP
+    return frame
 
-    interpreter.set_tensor(input_details[0]['index'], input_data)
-    interpreter.invoke()
-
-    boxes = interpreter.get_tensor(output_details[1]['index'])[0]
-    classes = interpreter.get_tensor(output_details[3]['index'])[0]
-    scores = interpreter.get_tensor(output_details[0]['index'])[0]
-
-    detections = []
-
-    for i in range(len(scores)):
-        if ((scores[i] > min_conf) and (scores[i] <= 1.0)):
-
-            ymin = int(max(1, (boxes[i][0] * imH)))
-            xmin = int(max(1, (boxes[i][1] * imW))+25)
-            ymax = int(min(imH, (boxes[i][2] * imH)))
-            xmax = int(min(imW, (boxes[i][3] * imW)))
-            cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (10, 255, 0), 2)
-
-            object_name = labels[int(classes[i])]  # Look up object name from "labels" array using class index
-            label = '%s: %d%%' % (object_name, int(scores[i] * 100))  # Example: 'person: 72%'
-            labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)  # Get font size
-            label_ymin = max(ymin, labelSize[1] + 10)  # Make sure not to draw label too close to top of window
-            cv2.rectangle(frame, (xmin, label_ymin - labelSize[1] - 10),(xmin + labelSize[0], label_ymin + baseLine - 10), (255, 255, 255),cv2.FILLED)  # Draw white box to put label text in
-            cv2.putText(frame, label, (xmin, label_ymin - 7), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0),2)  # Draw label text
-            detections.append([object_name, scores[i], xmin, ymin, xmax, ymax])
-
-            crop = frame[ymin:ymax, xmin:xmax]
-            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-            gray = cv2.bilateralFilter(gray, 10, 20, 20)
 
-            text = pytesseract.image_to_string(gray).strip()
-            text = text.replace('(', '').replace(')', '').replace(',', '').replace(']', '')
-            print(text)
+def find_boxes(frame):
+    """
+    Runs the model on a frame, locally or on detect_server.py.
 
-            if text not in processed_numbers:
-                processed_numbers.add(text)
-                list1.append(text)
-                current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    Returns:
+    list: (object_name, score, xmin, ymin, xmax, ymax) of the detections above min_conf, in pixels.
+    """
+    boxes, scores = detect_client.detect_boxes([frame])[0]
+    # The model has a single class, the licence plate
+    return [(labels[0], score, xmin, ymin, xmax, ymax) for (xmin, ymin, xmax, ymax), score in zip(boxes, scores)]
 
-                # Open the CSV file in append mode
-                with open("datasets/car_plate_data.csv", "a", newline='') as csvfile:
 
-                    writer = csv.writer(csvfile)
+def detect_plates(frame):
+    """
+    Detection stage: runs the model on a frame and draws the labelled boxes on it.
 
-                    writer.writerow([text, current_datetime])
+    Returns:
+    tuple: The frame and a list of [object_name, score, xmin, ymin, xmax, ymax] detections.
+    """
+    with metrics.timer('motion_gate'):
+        moving = motion_gate.update(frame)
+    if not moving:
+        return frame, []
 
-                cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 1)
-                cv2.imshow('crop', crop)
+    found = find_boxes(frame)
 
-    cv2.imshow('output', frame)
-    if (cv2.waitKey(1) & 0xFF == ord('q')):
-        break
+    detections = []
 
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+    box_start = time.perf_counter()
+    for object_name, score, xmin, ymin, xmax, ymax in found:
+        xmin += 25
+        cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (10, 255, 0), 2)
+
+        label = '%s: %d%%' % (object_name, int(score * 100))  # Example: 'person: 72%'
+        labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)  # Get font size
+        label_ymin = max(ymin, labelSize[1] + 10)  # Make sure not to draw label too close to top of window
+        cv2.rectangle(frame, (xmin, label_ymin - labelSize[1] - 10),(xmin + labelSize[0], label_ymin + baseLine - 10), (255, 255, 255),cv2.FILLED)  # Draw white box to put label text in
+        cv2.putText(frame, label, (xmin, label_ymin - 7), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0),2)  # Draw label text
+        detections.append([object_name, score, xmin, ymin, xmax, ymax])
+    metrics.observe('detect.boxes', time.perf_counter() - box_start)
+
+    return frame, detections
+
+
+def track_plates(item):
+    """
+    Tracking stage: assigns every detected plate to a track and collects the tracks that left the frame.
+
+    Returns:
+    tuple: The frame and the list of finished tracks.
+    """
+    frame, detections = item
+    boxes = [(xmin, ymin, xmax, ymax) for object_name, score, xmin, ymin, xmax, ymax in detections]
+    track_ids, finished = plate_tracker.update([(box, frame[box[1]:box[3], box[0]:box[2]]) for box in boxes])
+    for track_id, (xmin, ymin, xmax, ymax) in zip(track_ids, boxes):
+        cv2.putText(frame, f'#{track_id}', (xmin, ymax + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (10, 255, 0), 2)
+    return frame, finished
+
+
+def flush_tracks():
+    # End the tracks still open when the video stops
+    return None, plate_tracker.flush()
+
+
+def read_plates(item):
+    """
+    OCR stage: reads the best crops of every finished track and votes on one plate string per track.
+
+    Returns:
+    tuple: The frame and a list of (text, crop, track_id) plates.
+    """
+    frame, tracks = item
+    plates = []
+    for track in tracks:
+        crops = track.best_crops()
+        text = vote([ocr.read_plate_crop(crop, ocr_engine, ocr_cache, track.track_id) for crop in crops])
+        print(track.track_id, text)
+        plates.append((text, crops[0], track.track_id))
+    return frame, plates
+
+
+def persist_plates(item):
+    """
+    Persist stage: appends one row per vehicle passage to the CSV log.
+
+    Returns:
+    tuple: The frame and the best crop of every plate logged.
+    """
+    frame, plates = item
+    new_crops = []
+    for text, crop, track_id in plates:
+        if text:
+            list1.append(text)
+            current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with metrics.timer('persist.log'):
+                plate_log.write([text, current_datetime])
+            with metrics.timer('persist.authorization'):
+                authorized = authorization.get_index().is_authorized(text)
+            access = "Access granted" if authorized else "Access denied"
+            print(track_id, text, access)
+            new_crops.append(crop)
+    return frame, new_crops
+
+
+def print_stats(pipeline):
+    for name, stats in pipeline.stats().items():
+        print(f"{name}: {stats['processed']} items, {stats['per_second']:.1f}/s, "
+              f"{stats['busy'] * 100:.0f}% busy, {stats['queued']} queued, {stats['dropped']} dropped")
+    print('OCR cache:', ocr_cache.stats())
+    print('Motion gate:', motion_gate.stats())
+    print('Plate log:', plate_log.stats())
+    print('Authorization:', authorization.get_index().stats())
+    for name, stats in metrics.snapshot().items():
+        print(f"{name}: {stats['count']} calls, mean {stats['mean_ms']:.2f} ms, "
+              f"p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms")
+
+
+def main():
+    cap = cv2.VideoCapture(video_source)
+    # Per-stage timings, exported when METRICS_PORT or METRICS_JSON is set
+    metrics.start_exporters()
+
+    plate_log.start()
+    # Load the model before the first frame rather than inside the detect stage
+    detect_client.warmup()
+
+    pipeline = Pipeline([
+        ('capture', partial(capture_frame, cap), None, None),
+        ('detect', detect_plates, frame_queue_size, True),
+        ('track', track_plates, detection_queue_size, False, flush_tracks),
+        ('ocr', read_plates, track_queue_size, False),
+        ('persist', persist_plates, plate_queue_size, False),
+    ])
+    pipeline.start()
+
+    # Display runs on the main thread, which OpenCV's HighGUI requires on most platforms
+    last_report = time.perf_counter()
+    while True:
+        try:
+            item = pipeline.output.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is STOP:
+            break
+
+        frame, new_crops = item
+        for crop in new_crops:
+            cv2.imshow('crop', crop)
+        if frame is not None:
+            cv2.imshow('output', frame)
+        if (cv2.waitKey(1) & 0xFF == ord('q')):
+            pipeline.stop()
+
+        if time.perf_counter() - last_report >= stats_interval:
+            print_stats(pipeline)
+            last_report = time.perf_counter()
+
+    try:
+        # Raises the error of a stage that failed, after every stage has exited
+        pipeline.join()
+    finally:
+        plate_log.close()
+        print_stats(pipeline)
+        cap.release()
+        cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Slot assignment for arriving vehicles.
+
+Every lot's slots are split between vehicle types, and each (lot, slot type) pair
+keeps its free slots in a bitmap, so an arrival takes the lowest free slot with
+one bit operation and an exit gives it back with another. Slot numbers run on
+across lots and types, as in generaatorNew.py, so they are unique campus-wide.
+
+A vehicle is offered its registered lot first, then the lots its permit type
+allows, in order. Motorcycles may take a car slot when the motorcycle slots of
+a lot are full.
+"""
+import csv
+import os
+import threading
+from typing import NamedTuple
+
+import metrics
+from occupancy_engine import load_capacities
+from plates import normalize_plate
+
+permits_csv = 'approved_vehicles.csv~'
+
+# Share of every lot's slots built for each vehicle type; the last type gets the rounding remainder
+type_shares = {'Car': 0.6, 'Motorcycle': 0.3, 'Truck': 0.1}
+# Slot types each vehicle type fits in, in order of preference
+slot_types = {'Car': ('Car',), 'Motorcycle': ('Motorcycle', 'Car'), 'Truck': ('Truck',)}
+# Lots each permit type may use after the vehicle's registered lot, in order of preference
+permit_lots = {
+    'Faculty': ('A', 'B', 'C', 'D'),
+    'Staff': ('B', 'C', 'D'),
+    'Student': ('C', 'D'),
+    'Visitor': ('Visitor',),
+}
+# Used for vehicles without a permit record
+default_vehicle_type = 'Car'
+default_permit_type = 'Visitor'
+
+
+class Permit(NamedTuple):
+    lot: str
+    vehicle_type: str
+    permit_type: str
+
+
+class Assignment(NamedTuple):
+    lot: str
+    slot_number: int
+    slot_type: str
+
+
+def load_permits(path=permits_csv):
+    """
+    Reads the registered lot, vehicle type and permit type of every approved vehicle.
+
+    Returns:
+    dict: Permit per normalized plate, or an empty dict if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='') as f:
+        return {normalize_plate(row['NumberPlate']): Permit(row['Parking Lot'], row['Vehicle Type'], row['Permit Type'])
+                for row in csv.DictReader(f)}
+
+
+class SlotAllocator:
+    """
+    Thread-safe allocator of parking slots, shared by every gate.
+    """
+
+    def __init__(self, capacities=None, permits=None, type_shares=type_shares):
+        """
+        Parameters:
+        capacities (dict): Slots per lot, defaults to the lots in datasets/parking_data.csv.
+        permits (dict): Permit per normalized plate, defaults to load_permits().
+        type_shares (dict): Share of each lot's slots built for each vehicle type.
+        """
+        capacities = load_capacities() if capacities is None else capacities
+        self.permits = load_permits() if permits is None else permits
+
+        # (lot, slot type) -> first slot number, number of slots and free-slot bitmap (bit i = slot first + i)
+        self._first = {}
+        self._size = {}
+        self._free = {}
+        first = 1
+        for lot, capacity in capacities.items():
+            remaining = capacity
+            for i, slot_type in enumerate(type_shares):
+                size = remaining if i == len(type_shares) - 1 else min(remaining, round(capacity * type_shares[slot_type]))
+                remaining -= size
+                self._first[lot, slot_type] = first
+                self._size[lot, slot_type] = size
+                self._free[lot, slot_type] = (1 << size) - 1
+                first += size
+        self.lots = list(capacities)
+
+        # vehicle -> Assignment for every vehicle holding a slot
+        self._assignments = {}
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.releases = 0
+        self.rejections = 0
+
+    def candidate_lots(self, permit):
+        """
+        Returns the lots a vehicle with the given permit may park in, in order of preference.
+        """
+        lots = [permit.lot] if permit.lot in self.lots else []
+        lots.extend(lot for lot in permit_lots.get(permit.permit_type, ()) if lot in self.lots and lot not in lots)
+        return lots
+
+    def permit_for(self, vehicle_number):
+        return self.permits.get(normalize_plate(vehicle_number),
+                                Permit(None, default_vehicle_type, default_permit_type))
+
+    def allocate(self, vehicle_number, permit=None, lot=None):
+        """
+        Gives a vehicle the lowest free slot it may use.
+
+        Parameters:
+        vehicle_number (str): Plate of the arriving vehicle.
+        permit (Permit): Overrides the vehicle's permit record.
+        lot (str): Only look in this lot, e.g. the lot behind the gate the vehicle came through.
+
+        Returns:
+        Assignment: The lot, slot and slot type given to the vehicle, the slot it already
+        holds if it is still parked, or None if every slot it may use is taken.
+        """
+        with metrics.timer('slots.allocate'):
+            vehicle = normalize_plate(vehicle_number)
+            permit = permit or self.permit_for(vehicle)
+            types = slot_types.get(permit.vehicle_type, slot_types[default_vehicle_type])
+            lots = self.candidate_lots(permit)
+            if lot is not None:
+                lots = [lot] if lot in lots else []
+            with self._lock:
+                held = self._assignments.get(vehicle)
+                if held is not None:
+                    return held
+                for lot in lots:
+                    for slot_type in types:
+                        bits = self._free[lot, slot_type]
+                        if bits:
+                            lowest = bits & -bits
+                            self._free[lot, slot_type] = bits ^ lowest
+                            assignment = Assignment(lot, self._first[lot, slot_type] + lowest.bit_length() - 1,
+                                                    slot_type)
+                            self._assignments[vehicle] = assignment
+                            self.allocations += 1
+                            return assignment
+                self.rejections += 1
+                return None
+
+    def release(self, vehicle_number):
+        """
+        Frees the slot of a leaving vehicle.
+
+        Returns:
+        Assignment: The slot that was freed, or None if the vehicle held no slot.
+        """
+        vehicle = normalize_plate(vehicle_number)
+        with self._lock:
+            assignment = self._assignments.pop(vehicle, None)
+            if assignment is not None:
+                key = assignment.lot, assignment.slot_type
+                self._free[key] |= 1 << (assignment.slot_number - self._first[key])
+                self.releases += 1
+            return assignment
+
+    def claim(self, vehicle_number, lot, slot_number):
+        """
+        Marks a slot as held by a vehicle that is already parked, e.g. when restoring
+        the occupancy engine's state after a restart.
+
+        Returns:
+        Assignment: The claimed slot, or None if it does not exist in lot or is taken.
+        """
+        vehicle = normalize_plate(vehicle_number)
+        with self._lock:
+            for (slot_lot, slot_type), first in self._first.items():
+                index = slot_number - first
+                if slot_lot == lot and 0 <= index < self._size[slot_lot, slot_type]:
+                    if not self._free[slot_lot, slot_type] >> index & 1 or vehicle in self._assignments:
+                        return None
+                    self._free[slot_lot, slot_type] &= ~(1 << index)
+                    assignment = self._assignments[vehicle] = Assignment(lot, slot_number, slot_type)
+                    return assignment
+            return None
+
+    def assignment(self, vehicle_number):
+        with self._lock:
+            return self._assignments.get(normalize_plate(vehicle_number))
+
+    def free_slots(self):
+        """
+        Returns the number of free slots of every lot and slot type.
+
+        Returns:
+        dict: Lot -> {slot type: free slots}.
+        """
+        with self._lock:
+            free = {lot: {} for lot in self.lots}
+            for (lot, slot_type), bits in self._free.items():
+                free[lot][slot_type] = bits.bit_count()
+            return free
+
+    def stats(self):
+        with self._lock:
+            return {
+                'held': len(self._assignments),
+                'allocations': self.allocations,
+                'releases': self.releases,
+                'rejections': self.rejections,
+            }
@@ -0,0 +1,262 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import rollups
+
+db_path = os.environ.get('PARKING_DB', 'datasets/parking.db')
+parking_sessions_csv = 'datasets/indian_vehicle_parking_data.csv'
+# Timestamp format written by generaatorNew.py
+csv_time_format = '%m-%d-%Y %H:%M:%S'
+# Timestamps are stored as ISO text, which sorts and compares chronologically
+db_time_format = '%Y-%m-%d %H:%M:%S'
+
+SCHEMA = """
+-- The registry of authorized plates is read from its CSV by authorization.py
+DROP TABLE IF EXISTS authorized_vehicles;
+
+CREATE TABLE IF NOT EXISTS parking_sessions (
+    id INTEGER PRIMARY KEY,
+    vehicle_number TEXT NOT NULL,
+    in_time TIMESTAMP NOT NULL,
+    out_time TIMESTAMP,
+    slot_number INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_sessions_vehicle_in_time ON parking_sessions (vehicle_number, in_time);
+CREATE INDEX IF NOT EXISTS idx_sessions_in_time ON parking_sessions (in_time);
+CREATE INDEX IF NOT EXISTS idx_sessions_slot_in_time ON parking_sessions (slot_number, in_time);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+"""
+
+# Session columns under the names the pages and CSV files use
+SESSION_COLUMNS = """
+    vehicle_number AS "Vehicle Number",
+    in_time AS "In Time",
+    out_time AS "Out Time",
+    slot_number AS "Slot Number"
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+
+
+def get_connection():
+    """
+    Returns this thread's connection to the parking database, creating the schema and
+    importing the CSV datasets the first time the database is opened empty.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(db_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        with _init_lock:
+            conn.executescript(SCHEMA + rollups.SCHEMA)
+            if conn.execute('SELECT 1 FROM parking_sessions LIMIT 1').fetchone() is None:
+                import_csvs(conn)
+            elif conn.execute('SELECT 1 FROM occupancy_rollups LIMIT 1').fetchone() is None:
+                with conn:
+                    rollups.rebuild(conn)
+        _local.conn = conn
+    return conn
+
+
+def close_connection():
+    """
+    Closes this thread's connection, so the next get_connection() opens db_path again.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def format_time(value):
+    return value.strftime(db_time_format)
+
+
+def _update_max_duration(conn, seconds):
+    conn.execute("""
+        INSERT INTO meta (key, value) VALUES ('max_session_seconds', ?)
+        ON CONFLICT (key) DO UPDATE SET value = MAX(CAST(value AS REAL), CAST(excluded.value AS REAL))
+    """, (seconds,))
+
+
+def _max_duration(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'max_session_seconds'").fetchone()
+    return timedelta(seconds=float(row[0])) if row else timedelta(0)
+
+
+def import_csvs(conn, sessions_csv=parking_sessions_csv, chunksize=100_000):
+    """
+    Replaces the parking sessions in the database with the rows of the sessions CSV.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection to the parking database.
+    sessions_csv (str): CSV with Vehicle Number, In Time, Out Time and Slot Number columns.
+    chunksize (int): Session rows read and inserted at a time.
+
+    Returns:
+    int: Number of parking sessions imported.
+    """
+    count = 0
+    with conn:
+        conn.executescript(SCHEMA + rollups.SCHEMA)
+        conn.execute('DELETE FROM parking_sessions')
+        conn.execute("DELETE FROM meta WHERE key = 'max_session_seconds'")
+        # Row ids restart after the DELETE, so tell in-memory indexes the sessions were replaced
+        conn.execute("""
+            INSERT INTO meta (key, value) VALUES ('sessions_generation', 1)
+            ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        """)
+
+        if os.path.exists(sessions_csv):
+            max_seconds = 0.0
+            for chunk in pd.read_csv(sessions_csv, chunksize=chunksize):
+                in_time = pd.to_datetime(chunk['In Time'], format=csv_time_format, errors='coerce')
+                out_time = pd.to_datetime(chunk['Out Time'], format=csv_time_format, errors='coerce')
+                valid = in_time.notna()
+                durations = (out_time - in_time)[valid].dt.total_seconds()
+                if durations.notna().any():
+                    max_seconds = max(max_seconds, durations.max())
+                rows = pd.DataFrame({
+                    'vehicle_number': chunk['Vehicle Number'].astype(str),
+                    'in_time': in_time.dt.strftime(db_time_format),
+                    'out_time': out_time.dt.strftime(db_time_format),
+                    'slot_number': pd.to_numeric(chunk['Slot Number'], errors='coerce').astype('Int64'),
+                })[valid].astype(object)
+                rows = rows.where(rows.notna(), None).itertuples(index=False, name=None)
+                conn.executemany('INSERT INTO parking_sessions (vehicle_number, in_time, out_time, slot_number) '
+                                 'VALUES (?, ?, ?, ?)', rows)
+                count += int(valid.sum())
+            _update_max_duration(conn, max_seconds)
+        rollups.rebuild(conn)
+    conn.execute('ANALYZE')
+    return count
+
+
+def _query_sessions(where, params, order_by='in_time'):
+    return pd.read_sql_query(f'SELECT {SESSION_COLUMNS} FROM parking_sessions WHERE {where} ORDER BY {order_by}',
+                             get_connection(), params=params,
+                             parse_dates={'In Time': db_time_format, 'Out Time': db_time_format})
+
+
+def add_session(vehicle_number, in_time, out_time=None, slot_number=None):
+    """
+    Records one parking session. in_time and out_time are datetimes.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute('INSERT INTO parking_sessions (vehicle_number, in_time, out_time, slot_number) VALUES (?, ?, ?, ?)',
+                     (vehicle_number, format_time(in_time), format_time(out_time) if out_time else None, slot_number))
+        if out_time:
+            _update_max_duration(conn, (out_time - in_time).total_seconds())
+        rollups.add_session(conn, in_time, out_time, slot_number, _max_duration(conn))
+
+
+def all_sessions():
+    """
+    Returns every parking session, oldest first.
+    """
+    return _query_sessions('1', ())
+
+
+def sessions_version():
+    """
+    Returns (import generation, last session id). The generation changes when the sessions
+    are re-imported and the id grows when sessions are added, so in-memory indexes over the
+    sessions know whether to rebuild or to read only the new rows with sessions_added().
+    Both are primary key lookups, so this stays cheap however many sessions there are.
+    """
+    conn = get_connection()
+    generation = conn.execute("SELECT value FROM meta WHERE key = 'sessions_generation'").fetchone()
+    last_id = conn.execute('SELECT MAX(id) FROM parking_sessions').fetchone()[0]
+    return (int(generation[0]) if generation else 0, last_id or 0)
+
+
+def sessions_added(after_id, up_to_id):
+    """
+    Returns the sessions with after_id < id <= up_to_id, oldest first.
+    """
+    return _query_sessions('id > ? AND id <= ?', (after_id, up_to_id))
+
+
+def sessions_for_vehicle(vehicle_number):
+    """
+    Returns every session of a vehicle, oldest first.
+    """
+    return _query_sessions('vehicle_number = ?', (vehicle_number,))
+
+
+def sessions_for_vehicle_on_date(vehicle_number, day):
+    """
+    Returns the sessions of a vehicle that started on the given date.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    return _query_sessions('vehicle_number = ? AND in_time >= ? AND in_time < ?',
+                           (vehicle_number, format_time(start), format_time(start + timedelta(days=1))))
+
+
+def sessions_on_date(day):
+    """
+    Returns all sessions that started on the given date.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    return _query_sessions('in_time >= ? AND in_time < ?',
+                           (format_time(start), format_time(start + timedelta(days=1))))
+
+
+def sessions_active_at(moment):
+    """
+    Returns the sessions in progress at the given datetime.
+
+    Only sessions that started within the longest recorded session before moment can
+    still be in progress, which keeps the in_time index scan short.
+    """
+    earliest = moment - _max_duration(get_connection())
+    return _query_sessions('in_time >= ? AND in_time <= ? AND out_time >= ?',
+                           (format_time(earliest), format_time(moment), format_time(moment)))
+
+
+def hourly_occupancy(day, slot_number=rollups.LOT):
+    """
+    Returns the entries, exits, cars present and peak cars present in each hour of
+    the given date, for one slot or, by default, the whole lot.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    return rollups.query(get_connection(), 'hour', start, start + timedelta(days=1), slot_number)
+
+
+def daily_occupancy(first_day, last_day, slot_number=rollups.LOT):
+    """
+    Returns the entries, exits, cars present and peak cars present on each date from
+    first_day to last_day inclusive, for one slot or, by default, the whole lot.
+    """
+    start = datetime.combine(first_day, datetime.min.time())
+    end = datetime.combine(last_day, datetime.min.time()) + timedelta(days=1)
+    return rollups.query(get_connection(), 'day', start, end, slot_number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import the CSV datasets into the parking database.')
+    parser.add_argument('--db', default=db_path, help='SQLite database file')
+    parser.add_argument('--sessions', default=parking_sessions_csv, help='parking sessions CSV')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    start = time.perf_counter()
+    count = import_csvs(conn, args.sessions)
+    print(f"Imported {count} parking sessions into {args.db} in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == '__main__':
+    main()